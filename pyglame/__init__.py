@@ -225,8 +225,10 @@ if not _is_epydoc:
     draw     = _ModuleProxy('draw')
     event    = _ModuleProxy('event')
     font     = _ModuleProxy('font')
+    pack     = _ModuleProxy('pack')
     resource = _ModuleProxy('resource')
     surface  = _ModuleProxy('surface')
+    tilemap  = _ModuleProxy('tilemap')
     window   = _ModuleProxy('window')
 
 # Fool py2exe, py2app into including all top-level modules (doesn't understand
@@ -237,8 +239,10 @@ if False:
     import draw
     import event
     import font
+    import pack
     import resource
     import surface
+    import tilemap
     import window
 
 # Hack around some epydoc bug that causes it to think pyglet.window is None.
@@ -0,0 +1,134 @@
+# ----------------------------------------------------------------------------
+#
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+'''Open-addressing hash tables of record numbers, laid out to be looked up
+in place in a memory-mapped file.
+
+Used by `pyglame.pack` and `pyglame.surface.manifest`, which store their
+records sorted by name and index them with a table built by `write_table`.
+The table holds one unsigned 32-bit little-endian slot per entry; a slot
+holds the record number plus one, or zero if it is empty.  Names are hashed
+with CRC-32 and collisions are resolved by linear probing.  The table size
+is a power of two at least twice the number of records.
+
+:since: pyglame 0.0.1
+'''
+
+__docformat__ = 'restructuredtext'
+__version__ = '$Id$'
+
+import struct
+import zlib
+
+#: Size in bytes of one slot of a table.
+SLOT_SIZE = 4
+
+_slot = struct.Struct('<I')
+
+def encode(name):
+    '''Encode a name the way it is stored and hashed.
+
+    :Parameters:
+        `name` : str or unicode
+            Name to encode; unicode names are encoded as UTF-8.
+
+    :rtype: str
+    '''
+    if isinstance(name, unicode):
+        return name.encode('utf-8')
+    return name
+
+def hash_name(name):
+    '''Hash an encoded name.
+
+    :Parameters:
+        `name` : str
+            Name returned by `encode`.
+
+    :rtype: int
+    '''
+    return zlib.crc32(name) & 0xffffffff
+
+def write_table(names):
+    '''Build the hash table of a list of records.
+
+    :Parameters:
+        `names` : list of str
+            Encoded names of the records, in record order.
+
+    :rtype: (int, str)
+    :return: The number of slots of the table, and the packed table.
+    '''
+    table_size = 1
+    while table_size < len(names) * 2:
+        table_size *= 2
+    table = [0] * table_size
+    mask = table_size - 1
+    for i, name in enumerate(names):
+        slot = hash_name(name) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = i + 1
+    return table_size, struct.pack('<%dI' % table_size, *table)
+
+def find(data, offset, table_size, name, get_name):
+    '''Look up a record in a hash table.
+
+    :Parameters:
+        `data` : str, buffer or ``mmap.mmap``
+            Buffer holding the table.
+        `offset` : int
+            Offset of the table in `data`.
+        `table_size` : int
+            Number of slots of the table.
+        `name` : str or unicode
+            Name of the record to find.
+        `get_name` : callable
+            Called with a record number; returns the encoded name of the
+            record.
+
+    :rtype: int
+    :return: The record number of `name`, or None if it is not in the table.
+    '''
+    name = encode(name)
+    mask = table_size - 1
+    slot = hash_name(name) & mask
+    while True:
+        index, = _slot.unpack_from(data, offset + slot * SLOT_SIZE)
+        if not index:
+            return None
+        if get_name(index - 1) == name:
+            return index - 1
+        slot = (slot + 1) & mask
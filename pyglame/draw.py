@@ -53,15 +53,28 @@ def _pygame_get_surface(im):
     else:
         raise DrawException('Unable to find pygame.Surface.')
 
-def _pygame_get_unique_surface(surf_a, surf_b):
+def _pygame_get_source(im, rect):
+    if isinstance(im, surface.AbstractSurface):
+        psurf, area = im.get_blit_source()
+        if area is None:
+            return psurf, rect
+        if rect is not None:
+            rect = pygame.Rect(rect).move(area.x, area.y)
+            area = area.clip(rect)
+        return psurf, area
+    return _pygame_get_surface(im), rect
+
+def _pygame_get_unique_surface(surf_a, surf_b, rect=None):
     psurf_a = _pygame_get_surface(surf_a)
-    psurf_b = _pygame_get_surface(surf_b)
+    psurf_b, rect = _pygame_get_source(surf_b, rect)
     if psurf_a.get_abs_parent() == psurf_b.get_abs_parent():
-        return psurf_a, psurf_b.copy()
-    return psurf_a, psurf_b
+        if rect is not None:
+            return psurf_a, psurf_b.subsurface(rect).copy(), None
+        return psurf_a, psurf_b.copy(), None
+    return psurf_a, psurf_b, rect
 
 def blit_into(dest, src, x, y, rect=None, special=0):
-    psurf_dest, psurf_src = _pygame_get_unique_surface(dest, src)
+    psurf_dest, psurf_src, rect = _pygame_get_unique_surface(dest, src, rect)
 
     psurf_dest.blit(
         psurf_src, (x + src.anchor_x, y + src.anchor_y), rect, special)
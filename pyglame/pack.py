@@ -0,0 +1,270 @@
+# ----------------------------------------------------------------------------
+#
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+'''Single-file resource packs.
+
+A pack holds many resource files in one file that `pyglame.resource` can
+put on its path, like a ZIP file, but laid out to be memory-mapped: the
+name index is looked up in place, and files stored uncompressed are served
+as slices of the mapping without being copied.  Packs are built with
+``tools/make_resource_pack.py``, or with `write`::
+
+    from pyglame import pack
+
+    with open('assets.pack', 'wb') as file:
+        pack.write(file, [('images/player.png', data), ...])
+
+    assets = pack.PackFile.open('assets.pack')
+    data = assets.read('images/player.png')
+
+The file starts with a header, followed by one fixed-size record per file
+sorted by name, an open-addressing hash table of record numbers keyed by
+the CRC-32 of the name, the string table holding every name, and finally
+the contents of the files, each starting on a multiple of `ALIGNMENT`
+bytes.  Each file is stored as it is or compressed with zlib, whichever is
+smaller.  All integers are little-endian.
+
+:since: pyglame 0.0.1
+'''
+
+__docformat__ = 'restructuredtext'
+__version__ = '$Id$'
+
+import mmap
+import struct
+import zlib
+
+from pyglame import _hashtable
+
+#: Identifies resource packs.
+MAGIC = 'PGPK'
+
+#: Version of the format written by `write`.
+VERSION = 1
+
+#: File contents start on multiples of this many bytes.
+ALIGNMENT = 16
+
+#: Compression methods.
+STORED = 0
+DEFLATED = 1
+
+# magic, version, reserved, file count, hash table size, string table size.
+_header = struct.Struct('<4sHHIII')
+
+# Name hash, name offset, name length, compression, data offset, stored
+# size, size, CRC-32 of the contents.
+_record = struct.Struct('<IIHHQQQI')
+
+class PackException(Exception):
+    '''The file is not a pack this module can read, or is damaged.'''
+    pass
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def is_pack(filename):
+    '''Determine if a file is a resource pack.
+
+    :Parameters:
+        `filename` : str
+            Name of the file.
+
+    :rtype: bool
+    '''
+    try:
+        with open(filename, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except EnvironmentError:
+        return False
+
+def write(file, files, compress=True):
+    '''Write a resource pack.
+
+    :Parameters:
+        `file` : file-like object
+            File to write to, opened in binary mode.
+        `files` : list of (str, str)
+            Names and contents of the files.  Names use forward slashes.
+        `compress` : bool
+            If True, files are compressed where it makes them smaller.
+
+    '''
+    strings = []
+    string_size = 0
+    entries = []
+    for name, data in sorted(
+            (_hashtable.encode(name), data) for name, data in files):
+        method = STORED
+        stored = data
+        if compress:
+            compressed = zlib.compress(data, 9)
+            # Not worth inflating for a few percent.
+            if len(compressed) < len(data) * 0.9:
+                method = DEFLATED
+                stored = compressed
+        entries.append((name, method, stored, len(data),
+            zlib.crc32(data) & 0xffffffff, string_size))
+        strings.append(name)
+        string_size += len(name)
+
+    table_size, table = _hashtable.write_table(strings)
+
+    offset = _align(_header.size + len(entries) * _record.size +
+        table_size * _hashtable.SLOT_SIZE + string_size)
+    records = []
+    for name, method, stored, size, crc, name_offset in entries:
+        records.append(_record.pack(_hashtable.hash_name(name), name_offset,
+            len(name), method, offset, len(stored), size, crc))
+        offset = _align(offset + len(stored))
+
+    file.write(_header.pack(MAGIC, VERSION, 0,
+        len(entries), table_size, string_size))
+    file.write(''.join(records))
+    file.write(table)
+    file.write(''.join(strings))
+    position = _header.size + len(records) * _record.size + \
+        table_size * _hashtable.SLOT_SIZE + string_size
+    for name, method, stored, size, crc, name_offset in entries:
+        file.write('\0' * (_align(position) - position))
+        file.write(stored)
+        position = _align(position) + len(stored)
+
+class PackFile(object):
+    '''A resource pack, read on demand.
+
+    Only the records of the files that are read are decoded.  The pack can
+    be read from any number of threads at once.
+    '''
+    def __init__(self, data):
+        '''Read a pack from a buffer.
+
+        :Parameters:
+            `data` : str, buffer or ``mmap.mmap``
+                Contents of the pack file.
+
+        '''
+        if len(data) < _header.size:
+            raise PackException('Pack is truncated')
+        (magic, version, reserved, self._count, self._table_size,
+            string_size) = _header.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise PackException('Not a resource pack')
+        if version != VERSION:
+            raise PackException('Unsupported pack version %d' % version)
+
+        self._data = data
+        self._records = _header.size
+        self._table = self._records + self._count * _record.size
+        self._strings = self._table + self._table_size * _hashtable.SLOT_SIZE
+        if len(data) < self._strings + string_size:
+            raise PackException('Pack is truncated')
+
+    @classmethod
+    def open(cls, filename):
+        '''Read a pack from a file, memory-mapping it if possible.
+
+        :Parameters:
+            `filename` : str
+                Name of the pack file.
+
+        :rtype: `PackFile`
+        '''
+        with open(filename, 'rb') as file:
+            try:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError):
+                data = file.read()
+        return cls(data)
+
+    def _get_string(self, offset, length):
+        start = self._strings + offset
+        return self._data[start:start + length]
+
+    def _get_record(self, index):
+        return _record.unpack_from(
+            self._data, self._records + index * _record.size)
+
+    def _find(self, name):
+        # Returns the unpacked record of `name`, or None.
+        index = _hashtable.find(self._data, self._table, self._table_size,
+            name, lambda i: self._get_string(*self._get_record(i)[1:3]))
+        if index is None:
+            return None
+        return self._get_record(index)
+
+    def read(self, name):
+        '''Read the contents of a file.
+
+        Files stored uncompressed are returned as a slice of the pack,
+        without copying them.
+
+        :Parameters:
+            `name` : str
+                Name of the file.
+
+        :rtype: buffer
+        '''
+        record = self._find(name)
+        if record is None:
+            raise KeyError(name)
+        method, offset, stored_size, size, crc = record[3:]
+        if offset + stored_size > len(self._data):
+            raise PackException('Pack is truncated')
+        data = buffer(self._data, offset, stored_size)
+        if method == STORED:
+            return data
+        if method != DEFLATED:
+            raise PackException(
+                'Unsupported compression method %d' % method)
+        try:
+            data = zlib.decompress(data)
+        except zlib.error:
+            raise PackException('Bad compressed data for file %r' % name)
+        if len(data) != size or zlib.crc32(data) & 0xffffffff != crc:
+            raise PackException('Bad CRC-32 for file %r' % name)
+        return buffer(data)
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        # Names are yielded in sorted order.
+        for i in range(self._count):
+            record = self._get_record(i)
+            yield self._get_string(record[1], record[2])
@@ -47,9 +47,9 @@ directory as the application's script files.
 
 This module allows applications to specify a search path for resources.
 Relative paths are taken to be relative to the application's __main__ module.
-ZIP files can appear on the path; they will be searched inside.  The resource
-module also behaves as expected when applications are bundled using py2exe or
-py2app.
+ZIP files and resource packs (see `pyglame.pack`) can appear on the path; they
+will be searched inside.  The resource module also behaves as expected when
+applications are bundled using py2exe or py2app.
 
 As well as providing file references (with the `file` function), the resource
 module also contains convenience functions for loading images, textures,
@@ -68,9 +68,9 @@ order given in the path.  If a location is not valid (for example, if the
 directory does not exist), it is skipped.
 
 Locations in the path beginning with an ampersand (''@'' symbol) specify
-Python packages.  Other locations specify a ZIP archive or directory on the
-filesystem.  Locations that are not absolute are assumed to be relative to the
-script home.  Some examples::
+Python packages.  Other locations specify a ZIP archive, resource pack (see
+`pyglame.pack`) or directory on the filesystem.  Locations that are not
+absolute are assumed to be relative to the script home.  Some examples::
 
     # Search just the `res` directory, assumed to be located alongside the
     # main script file.
@@ -88,6 +88,68 @@ platforms.
 The default path is ``['.']``.  If you modify the path, you must call
 `reindex`.
 
+Indexing a large asset tree means listing every directory and ZIP file on
+the path.  Set `index_cache` (or pass ``index_cache`` to `Loader`) to a
+filename to keep the index between runs; directories whose modification
+time is unchanged, and ZIP files whose size and modification time are
+unchanged, are then not scanned again::
+
+    pyglame.resource.index_cache = 'resources.idx'
+    pyglame.resource.reindex()
+
+If an application only needs a few of its resources early on, set `lazy`
+instead, so that directories are only listed the first time a resource in
+them (or in a directory below them) is looked up.  Both can be combined:
+the directories a lazy loader lists are added to the cache as it goes.
+
+To pick up files added or removed while the application runs, call `poll`,
+which only lists the directories whose modification time changed, or
+`watch` to have it called periodically from `pyglame.clock`::
+
+    pyglame.resource.watch(interval=0.5)
+
+Bundles
+^^^^^^^
+
+The resources a level needs can be listed in a bundle manifest,
+``<name>.bundle.json``, and loaded together with `load_bundle`, which reads
+the files of each location in one go and packs the images into atlases of
+their own.  `unload_bundle` releases them together::
+
+    level = pyglame.resource.load_bundle('levels/level3')
+    tiles = level.images['levels/tiles.png']
+    ...
+    level.unload()
+
+Loading in the background
+^^^^^^^^^^^^^^^^^^^^^^^^^
+
+`image_async` returns a `LoadFuture` for an image that is read and decoded
+by the loader's threads.  Packing decoded images into atlases has to happen
+on the main thread, so it is done by `finish_loads` every frame, within a
+time budget (`Loader.load_budget`).  `prefetch` loads a list of images and
+returns a `LoadProgress` for drawing a loading screen::
+
+    progress = pyglame.resource.prefetch(['level2/tiles.png', 'boss.png'])
+
+    def on_draw():
+        draw_progress_bar(progress.fraction)
+        if progress.done():
+            start_level()
+
+Baked atlases
+^^^^^^^^^^^^^
+
+Atlases baked ahead of time with ``tools/make_resource_atlas.py`` are picked
+up automatically: any file on the path ending in ``.atlas.json`` or
+``.atlas.bin`` is read as an atlas manifest, and the images it lists are
+served by `Loader.image` as regions of the baked atlas images, which are each
+loaded only once.  Binary manifests (see `pyglame.surface.manifest`) are
+memory-mapped and only decode the entries that are looked up.  Image names
+in a manifest are relative to the directory containing it.  Images the
+baker trimmed keep their offset in ``anchor_x`` and ``anchor_y``; images it
+rotated are turned back and packed like any other image.
+
 :since: pyglet 1.1
 '''
 
@@ -97,8 +159,18 @@ __version__ = '$Id: $'
 import os
 import weakref
 import sys
+import collections
+import threading
+import Queue
+import json
+import marshal
+import time
 import zipfile
+import mmap
+import struct
+import zlib
 import StringIO
+import cStringIO
 
 import pygame
 import pyglame
@@ -194,6 +266,50 @@ class Location(object):
         '''
         raise NotImplementedError('abstract')
 
+    def read_files(self, filenames):
+        '''Read the contents of several files at this location.
+
+        Locations that can read files more efficiently together than one
+        at a time override this method.
+
+        :Parameters:
+            `filenames` : list of str
+                The filenames to read.
+
+        :rtype: dict
+        :return: Map of filename to the contents of the file.
+        :since: pyglame 0.0.1
+        '''
+        data = {}
+        for filename in sorted(filenames):
+            file = self.open(filename)
+            try:
+                data[filename] = file.read()
+            finally:
+                file.close()
+        return data
+
+    def buffer(self, filename):
+        '''Get the contents of a file at this location as a buffer.
+
+        Locations that can do so return a view of the file mapped into
+        memory, without copying it; otherwise the file is read.  The
+        buffer can be wrapped in ``cStringIO.StringIO`` for decoders that
+        need a file object, again without copying it.
+
+        :Parameters:
+            `filename` : str
+                The filename to read.
+
+        :rtype: buffer
+        :since: pyglame 0.0.1
+        '''
+        file = self.open(filename)
+        try:
+            return _buffer(file.read())
+        finally:
+            file.close()
+
 class FileLocation(Location):
     '''Location on the filesystem.
     '''
@@ -209,31 +325,161 @@ class FileLocation(Location):
     def open(self, filename, mode='rb'):
         return open(os.path.join(self.path, filename), mode)
 
+    def buffer(self, filename):
+        with open(os.path.join(self.path, filename), 'rb') as file:
+            return _map_file(file)
+
 class ZIPLocation(Location):
     '''Location within a ZIP file.
+
+    Members are read from the archive mapped into memory, so any number of
+    threads can read from the same location at once.  Only archives that
+    can't be mapped, and members that are encrypted or use compression
+    other than deflate, are read through the shared ``zipfile.ZipFile``,
+    one thread at a time.
     '''
     def __init__(self, zip, dir):
         '''Create a location given an open ZIP file and a path within that
         file.
 
         :Parameters:
-            `zip` : ``zipfile.ZipFile``
-                An open ZIP file from the ``zipfile`` module.
+            `zip` : ``zipfile.ZipFile`` or str
+                An open ZIP file from the ``zipfile`` module, or the filename
+                of a ZIP file to open the first time it is needed.
             `dir` : str
                 A path within that ZIP file.  Can be empty to specify files at
                 the top level of the ZIP file.
 
         '''
-        self.zip = zip
+        self._zip = zip
         self.dir = dir
+        # ZipFile isn't safe to read from several threads at once, and its
+        # directory and the mapping are only made once.
+        self._lock = threading.Lock()
+        # The archive mapped into memory, or False if it can't be.
+        self._map = None
+
+    def _get_zip(self):
+        if isinstance(self._zip, basestring):
+            with self._lock:
+                if isinstance(self._zip, basestring):
+                    self._zip = zipfile.ZipFile(self._zip, 'r')
+        return self._zip
+
+    def _get_map(self):
+        if self._map is None:
+            zip = self.zip
+            with self._lock:
+                if self._map is None:
+                    try:
+                        with open(zip.filename, 'rb') as file:
+                            self._map = mmap.mmap(file.fileno(), 0,
+                                access=mmap.ACCESS_READ)
+                    except (EnvironmentError, TypeError, ValueError):
+                        self._map = False
+        return self._map
+
+    zip = property(_get_zip,
+        doc='''The ``zipfile.ZipFile`` this location reads from.
+
+        :type: ``zipfile.ZipFile``
+        ''')
 
     def open(self, filename, mode='rb'):
+        return cStringIO.StringIO(self.buffer(filename))
+
+    def buffer(self, filename):
+        # Members stored without compression are served straight from the
+        # archive mapped into memory, and deflated members are inflated from
+        # it.
         if self.dir:
             path = self.dir + '/' + filename
         else:
             path = filename
-        text = self.zip.read(path)
-        return StringIO.StringIO(text)
+        zip = self.zip
+        info = zip.getinfo(path)
+        map = self._get_map()
+        if not map or info.flag_bits & 0x1 or info.compress_type not in \
+                (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            with self._lock:
+                return _buffer(zip.read(info))
+
+        # The data follows the local file header, which has its own name and
+        # extra field lengths.
+        name_length, extra_length = struct.unpack_from(
+            '<HH', map, info.header_offset + 26)
+        offset = info.header_offset + 30 + name_length + extra_length
+        data = _buffer(map, offset, info.compress_size)
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -15)
+            if zlib.crc32(data) & 0xffffffff != info.CRC:
+                raise zipfile.BadZipfile(
+                    'Bad CRC-32 for file %r' % info.filename)
+            data = _buffer(data)
+        return data
+
+    def read_files(self, filenames):
+        # Members are read in the order they are stored, in one pass over
+        # the archive.
+        prefix = ''
+        if self.dir:
+            prefix = self.dir + '/'
+        data = {}
+        zip = self.zip
+        infos = [(zip.getinfo(prefix + filename), filename)
+            for filename in filenames]
+        infos.sort(key=lambda (info, filename): info.header_offset)
+        for info, filename in infos:
+            data[filename] = self.buffer(filename)[:]
+        return data
+
+class PackLocation(Location):
+    '''Location within a resource pack (see `pyglame.pack`).
+
+    Files are read from the pack mapped into memory, so any number of
+    threads can read from the same location at once.
+
+    :since: pyglame 0.0.1
+    '''
+    def __init__(self, pack, dir):
+        '''Create a location given a pack and a path within it.
+
+        :Parameters:
+            `pack` : `pyglame.pack.PackFile` or str
+                A pack, or the filename of a pack to open the first time it
+                is needed.
+            `dir` : str
+                A path within the pack.  Can be empty to specify files at
+                the top level of the pack.
+
+        '''
+        self._pack = pack
+        self.dir = dir
+        self._lock = threading.Lock()
+
+    def _get_pack(self):
+        if isinstance(self._pack, basestring):
+            with self._lock:
+                if isinstance(self._pack, basestring):
+                    self._pack = pyglame.pack.PackFile.open(self._pack)
+        return self._pack
+
+    pack = property(_get_pack,
+        doc='''The `pyglame.pack.PackFile` this location reads from.
+
+        :type: `pyglame.pack.PackFile`
+        ''')
+
+    def open(self, filename, mode='rb'):
+        return cStringIO.StringIO(self.buffer(filename))
+
+    def buffer(self, filename):
+        if self.dir:
+            filename = self.dir + '/' + filename
+        try:
+            return self.pack.read(filename)
+        except KeyError:
+            raise IOError('No such file in pack: %r' % filename)
 
 class URLLocation(Location):
     '''Location on the network.
@@ -257,11 +503,706 @@ class URLLocation(Location):
         url = urlparse.urljoin(self.base, filename)
         return urllib2.urlopen(url)
 
+class CachedURLLocation(URLLocation):
+    '''Location on the network, cached on disk.
+
+    Files are fetched over persistent HTTP connections, which are reused
+    between requests and shared by the threads of `prefetch`.  Responses
+    are kept in `cache_dir` along with their ``ETag`` and
+    ``Last-Modified`` headers, and are only downloaded again if the server
+    says they changed.  If the server can't be reached or fails with a
+    server error, the cached copy is used.  Redirects are followed as long
+    as they stay on the host of the base URL.
+
+    :since: pyglame 0.0.1
+    '''
+    def __init__(self, base_url, cache_dir=None,
+            max_cache_size=64 * 1024 * 1024, max_connections=4, timeout=10,
+            max_redirects=5):
+        '''Create a location given a base URL.
+
+        :Parameters:
+            `base_url` : str
+                URL string to prepend to filenames.  Only ``http`` and
+                ``https`` URLs are supported, and filenames that lead to
+                another scheme or host raise `ValueError`.
+            `cache_dir` : str
+                Directory to keep downloaded files in, created if needed,
+                or None to not keep them.
+            `max_cache_size` : int
+                Bytes of files to keep in `cache_dir`.  The least recently
+                used files are removed first.
+            `max_connections` : int
+                Number of idle connections to keep open.
+            `timeout` : float
+                Seconds to wait for the server to connect or respond before
+                giving up, and using the cached copy if there is one.
+            `max_redirects` : int
+                Number of redirects to follow for each file.
+
+        '''
+        import urlparse
+        super(CachedURLLocation, self).__init__(base_url)
+        parts = urlparse.urlsplit(base_url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError('Unsupported URL scheme %r' % parts.scheme)
+        self._scheme = parts.scheme
+        self._host = parts.netloc
+        self.cache_dir = cache_dir
+        self.max_cache_size = max_cache_size
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+
+        self._lock = threading.Lock()
+        self._connections = []
+        # Map cache key to the size of the cached file, read from
+        # `cache_dir` when first needed.
+        self._cache_sizes = None
+
+    def open(self, filename, mode='rb'):
+        return cStringIO.StringIO(self._fetch(filename))
+
+    def buffer(self, filename):
+        return _buffer(self._fetch(filename))
+
+    def prefetch(self, filenames, threads=4):
+        '''Download several files into the cache at once.
+
+        :Parameters:
+            `filenames` : list of str
+                The filenames to download.
+            `threads` : int
+                Number of files to download at a time.
+
+        :rtype: dict
+        :return: Map of filename to the exception raised downloading it,
+            for the files that couldn't be downloaded.
+        '''
+        jobs = Queue.Queue()
+        for filename in filenames:
+            jobs.put(filename)
+        errors = {}
+
+        def download():
+            while True:
+                try:
+                    filename = jobs.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    self._fetch(filename)
+                except Exception, e:
+                    errors[filename] = e
+
+        workers = [threading.Thread(target=download)
+            for i in range(min(threads, len(filenames)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return errors
+
+    def _fetch(self, filename):
+        import hashlib
+        import httplib
+        import urlparse
+        import urllib2
+
+        url = urlparse.urljoin(self.base, filename)
+        if not self._is_on_host(url):
+            raise ValueError('URL %r is not on %s://%s' %
+                (url, self._scheme, self._host))
+        key = hashlib.sha1(url).hexdigest()
+        cached = self._read_cache(key)
+
+        headers = {}
+        if cached is not None:
+            meta, data = cached
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        request_url = url
+        for i in range(self.max_redirects + 1):
+            try:
+                status, reason, response_headers, body = \
+                    self._request(request_url, headers)
+            except (EnvironmentError, httplib.HTTPException):
+                if cached is None:
+                    raise
+                # Work offline from the cache.
+                return cached[1]
+            if status not in (301, 302, 303, 307, 308):
+                break
+
+            location = response_headers.getheader('location')
+            if not location:
+                raise urllib2.HTTPError(request_url, status,
+                    'Redirect without a Location header', response_headers,
+                    None)
+            location = urlparse.urljoin(request_url, location)
+            if not self._is_on_host(location):
+                raise urllib2.HTTPError(request_url, status,
+                    'Redirect to %s, which is not on %s://%s' %
+                        (location, self._scheme, self._host),
+                    response_headers, None)
+            request_url = location
+        else:
+            raise urllib2.HTTPError(request_url, status,
+                'More than %d redirects' % self.max_redirects,
+                response_headers, None)
+
+        if status == 304 and cached is not None:
+            self._touch_cache(key)
+            return cached[1]
+        if status >= 500 and cached is not None:
+            # The server is having trouble, so use the cached copy.
+            return cached[1]
+        if status != 200:
+            raise urllib2.HTTPError(request_url, status, reason,
+                response_headers, None)
+
+        self._write_cache(key, {
+            'url': url,
+            'etag': response_headers.getheader('etag'),
+            'last_modified': response_headers.getheader('last-modified')},
+            body)
+        return body
+
+    def _is_on_host(self, url):
+        # Connections are made to the host of `base`, so absolute filenames
+        # (or redirects) leading elsewhere can't be fetched.
+        import urlparse
+        parts = urlparse.urlsplit(url)
+        return parts.scheme == self._scheme and \
+            parts.netloc.lower() == self._host.lower()
+
+    def _request(self, url, headers):
+        # Returns the status, reason, headers and body of a GET request.
+        # A kept-alive connection may have been closed by the server, so the
+        # request is tried again on a new connection if it fails on an old
+        # one.
+        import httplib
+        import urlparse
+
+        parts = urlparse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        while True:
+            connection, reused = self._get_connection()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (EnvironmentError, httplib.HTTPException):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._put_connection(connection)
+            return response.status, response.reason, response.msg, body
+
+    def _get_connection(self):
+        import httplib
+        with self._lock:
+            if self._connections:
+                return self._connections.pop(), True
+        if self._scheme == 'https':
+            return httplib.HTTPSConnection(self._host,
+                timeout=self.timeout), False
+        return httplib.HTTPConnection(self._host, timeout=self.timeout), False
+
+    def _put_connection(self, connection):
+        with self._lock:
+            if len(self._connections) < self.max_connections:
+                self._connections.append(connection)
+                return
+        connection.close()
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_cache(self, key):
+        # Returns the cached headers and data of a URL, or None.  Cache
+        # files hold the headers as a line of JSON, followed by the data.
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._cache_path(key), 'rb') as file:
+                meta = json.loads(file.readline())
+                data = file.read()
+        except (EnvironmentError, ValueError):
+            return None
+        return meta, data
+
+    def _touch_cache(self, key):
+        # The modification time of cached files records when they were
+        # last used.
+        try:
+            os.utime(self._cache_path(key), None)
+        except EnvironmentError:
+            pass
+
+    def _write_cache(self, key, meta, data):
+        # The cache is only an optimisation, so failing to write it is
+        # ignored.  Files are written to a temporary file first so that
+        # other threads never see half of one.
+        if self.cache_dir is None or len(data) > self.max_cache_size:
+            return
+        path = self._cache_path(key)
+        temp_path = '%s.%d.tmp' % (path, threading.current_thread().ident)
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(temp_path, 'wb') as file:
+                file.write(json.dumps(meta) + '\n')
+                file.write(data)
+            with self._lock:
+                # os.rename replaces the target atomically, except on
+                # Windows, where it fails if the target exists.
+                if os.name == 'nt' and os.path.exists(path):
+                    os.remove(path)
+                os.rename(temp_path, path)
+                sizes = self._get_cache_sizes()
+                sizes[key] = os.path.getsize(path)
+                self._trim_cache(sizes)
+        except EnvironmentError:
+            pass
+
+    def _get_cache_sizes(self):
+        if self._cache_sizes is None:
+            self._cache_sizes = {}
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if '.' not in name and os.path.isfile(path):
+                    self._cache_sizes[name] = os.path.getsize(path)
+        return self._cache_sizes
+
+    def _trim_cache(self, sizes):
+        total = sum(sizes.values())
+        if total <= self.max_cache_size:
+            return
+        by_age = []
+        for key in sizes:
+            try:
+                by_age.append((os.path.getmtime(self._cache_path(key)), key))
+            except EnvironmentError:
+                by_age.append((0, key))
+        by_age.sort()
+        for mtime, key in by_age:
+            if total <= self.max_cache_size:
+                break
+            total -= sizes.pop(key)
+            try:
+                os.remove(self._cache_path(key))
+            except EnvironmentError:
+                pass
+
+# The default loader's `buffer` replaces the builtin at the end of the module.
+_buffer = buffer
+
+def _map_file(file):
+    # Returns a buffer of the file mapped into memory, or of its contents if
+    # it can't be mapped (for example, because it is empty).
+    try:
+        return _buffer(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+    except (EnvironmentError, ValueError):
+        return _buffer(file.read())
+
+#: Version of the index cache files written by `Loader.reindex`.
+INDEX_CACHE_VERSION = 2
+
+def _get_mtime(path):
+    # Directories changed within the timestamp resolution of the filesystem
+    # may change again without their mtime changing, so they are never
+    # trusted.
+    mtime = os.stat(path).st_mtime
+    if time.time() - mtime < 2:
+        return None
+    return mtime
+
+def _join(dirpath, filename):
+    if dirpath:
+        return dirpath + '/' + filename
+    return filename
+
+def _list_directory(root, dirpath, cached=None):
+    # Returns ``(mtime, filenames, subdirectories)`` for a directory under
+    # `root`, or None if there is no such directory.  Adding, removing or
+    # renaming a file changes the mtime of its directory, so `cached` is
+    # returned as it is if the mtime is unchanged.
+    path = os.path.join(root, *dirpath.split('/'))
+    try:
+        mtime = _get_mtime(path)
+    except OSError:
+        return None
+    if cached is not None and cached[0] is not None and cached[0] == mtime:
+        return cached
+
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return None
+    filenames = []
+    subdirs = []
+    for name in names:
+        child = os.path.join(path, name)
+        if os.path.isdir(child):
+            # Like os.walk, don't follow links to directories.
+            if not os.path.islink(child):
+                subdirs.append(name)
+        else:
+            filenames.append(name)
+    return (mtime, filenames, subdirs)
+
+def _same_listing(a, b):
+    return a is b or (a is not None and b is not None and a[1:] == b[1:])
+
+def _scan_directory(root, cached):
+    # Returns the index entry of a directory, mapping every directory under
+    # it to its `_list_directory` result.  Only directories that changed
+    # since `cached` are listed again, and `cached` itself is returned if
+    # nothing changed.
+    old_dirs = {}
+    if cached is not None and cached['type'] == 'dir':
+        old_dirs = cached['dirs']
+
+    dirs = {}
+    pending = ['']
+    while pending:
+        dirpath = pending.pop()
+        listing = _list_directory(root, dirpath, old_dirs.get(dirpath))
+        if listing is None:
+            continue
+        dirs[dirpath] = listing
+        for subdir in listing[2]:
+            pending.append(_join(dirpath, subdir))
+
+    if cached is not None and len(dirs) == len(old_dirs) and \
+            all(_same_listing(listing, old_dirs.get(dirpath))
+                for dirpath, listing in dirs.items()):
+        return cached
+    return {'type': 'dir', 'dirs': dirs}
+
+def _refresh_directories(root, entry):
+    # Like `_scan_directory`, but only checks the directories already in
+    # `entry`, for loaders that index lazily.
+    changed = False
+    dirs = {}
+    for dirpath, listing in entry['dirs'].items():
+        dirs[dirpath] = _list_directory(root, dirpath, listing)
+        changed = changed or not _same_listing(dirs[dirpath], listing)
+    if not changed:
+        return entry
+    return {'type': 'dir', 'dirs': dirs}
+
+def _open_archive(path, dir):
+    # Returns the location of a directory within a ZIP or pack file.
+    if pyglame.pack.is_pack(path):
+        return PackLocation(path, dir)
+    return ZIPLocation(path, dir)
+
+def _scan_archive(path, dir, cached):
+    # Returns the index entry of a directory within a ZIP or pack file, or
+    # None if it is neither.  The cached entry is reused if the size and
+    # mtime of the file are unchanged.
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if cached is not None and cached['type'] in ('zip', 'pack') and \
+            cached['size'] == stat.st_size and \
+            cached['mtime'] == stat.st_mtime and cached['dir'] == dir:
+        return cached
+
+    if pyglame.pack.is_pack(path):
+        try:
+            pack_names = list(pyglame.pack.PackFile.open(path))
+        except pyglame.pack.PackException:
+            return None
+        prefix = ''
+        if dir:
+            prefix = dir + '/'
+        names = [name[len(prefix):] for name in pack_names
+            if name.startswith(prefix)]
+        return {'type': 'pack', 'dir': dir, 'size': stat.st_size,
+            'mtime': stat.st_mtime, 'names': names}
+
+    if not zipfile.is_zipfile(path):
+        return None
+    zip = zipfile.ZipFile(path, 'r')
+    names = []
+    for zip_name in zip.namelist():
+        #zip_name_dir, zip_name = os.path.split(zip_name)
+        #assert '\\' not in name_dir
+        #assert not name_dir.endswith('/')
+        if zip_name.startswith(dir):
+            if dir:
+                zip_name = zip_name[len(dir)+1:]
+            names.append(zip_name)
+    zip.close()
+    return {'type': 'zip', 'dir': dir, 'size': stat.st_size,
+        'mtime': stat.st_mtime, 'names': names}
+
+def _get_entry_names(entry):
+    if entry['type'] in ('zip', 'pack'):
+        return entry['names']
+    # Lazy loaders record directories that don't exist as None.
+    return [_join(dirpath, filename)
+        for dirpath, listing in entry['dirs'].items() if listing is not None
+        for filename in listing[1]]
+
+def _load_index_cache(filename):
+    # marshal is used as it is fast, and keeps byte and unicode filenames
+    # apart.
+    try:
+        with open(filename, 'rb') as file:
+            cache = marshal.load(file)
+    except (EnvironmentError, EOFError, ValueError, TypeError):
+        return {}
+    if not isinstance(cache, dict) or \
+            cache.get('version') != INDEX_CACHE_VERSION:
+        return {}
+    return cache['entries']
+
+def _save_index_cache(filename, entries):
+    # The cache is only an optimisation, so failing to write it is ignored.
+    # It is written to a temporary file first so that a reader never sees
+    # half of it.
+    temp_filename = filename + '.tmp'
+    try:
+        with open(temp_filename, 'wb') as file:
+            marshal.dump(
+                {'version': INDEX_CACHE_VERSION, 'entries': entries}, file)
+        # os.rename replaces the target atomically, except on Windows, where
+        # it fails if the target exists.
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(temp_filename, filename)
+    except EnvironmentError:
+        pass
+
+def _unique_names(names):
+    # Returns `names` without repeats, in order.
+    seen = set()
+    unique = []
+    for name in names:
+        if name not in seen:
+            seen.add(name)
+            unique.append(name)
+    return unique
+
+def _get_bundle_names(manifest_name, manifest, kind, dir):
+    # Returns the names listed under `kind` in a bundle manifest, relative to
+    # the resource path.
+    names = manifest.get(kind)
+    if names is None:
+        return []
+    if not isinstance(names, list) or \
+            not all(isinstance(name, basestring) for name in names):
+        raise ValueError('"%s" in bundle manifest "%s" is not a list of '
+            'filenames' % (kind, manifest_name))
+    return _unique_names(dir + name for name in names)
+
+class LoadFuture(object):
+    '''The result of a resource loaded in the background.
+
+    Futures are returned by `Loader.image_async` and `Loader.prefetch`.  The
+    file is read and decoded by one of the loader's threads, and the result
+    is finished (for example, packed into an atlas) on the main thread by
+    `Loader.finish_loads`, which is called every frame while loads are
+    pending.
+
+    :Ivariables:
+        `name` : str
+            Name of the resource being loaded.
+
+    :since: pyglame 0.0.1
+    '''
+    def __init__(self, loader, name):
+        self.name = name
+        self._loader = loader
+        self._decoded = threading.Event()
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        '''Determine if the resource has finished loading.
+
+        :rtype: bool
+        '''
+        return self._done
+
+    def result(self):
+        '''Get the loaded resource.
+
+        If it hasn't finished loading yet, this waits for it to be decoded
+        and finishes it immediately.  This may only be called from the main
+        thread.
+
+        :rtype: `AbstractSurface`
+        '''
+        if not self._done:
+            self._decoded.wait()
+            self._loader._finish(self)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        '''Get the exception raised while loading the resource, if any.
+
+        :rtype: Exception
+        '''
+        if not self._done:
+            self._decoded.wait()
+            self._loader._finish(self)
+        return self._exception
+
+    def add_done_callback(self, func):
+        '''Call a function once the resource has finished loading.
+
+        The function is called on the main thread with the future as its
+        only argument.  If the resource has already finished loading, it
+        is called immediately.
+
+        :Parameters:
+            `func` : callable
+                The function to call.
+
+        '''
+        if self._done:
+            func(self)
+        else:
+            self._callbacks.append(func)
+
+    def _set_result(self, result, exception=None):
+        self._result = result
+        self._exception = exception
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for func in callbacks:
+            func(self)
+
+class LoadProgress(object):
+    '''Progress of a group of background loads, for loading screens.
+
+    Returned by `Loader.prefetch`.
+
+    :Ivariables:
+        `futures` : list of `LoadFuture`
+            The futures of the resources being loaded, in the order
+            they were requested.
+
+    :since: pyglame 0.0.1
+    '''
+    def __init__(self, futures):
+        self.futures = futures
+
+    def _get_total(self):
+        return len(self.futures)
+
+    total = property(_get_total,
+        doc='''Number of resources being loaded.
+
+        :type: int
+        ''')
+
+    def _get_loaded(self):
+        return len([future for future in self.futures if future.done()])
+
+    loaded = property(_get_loaded,
+        doc='''Number of resources that have finished loading.
+
+        :type: int
+        ''')
+
+    def _get_fraction(self):
+        if not self.futures:
+            return 1.0
+        return float(self.loaded) / len(self.futures)
+
+    fraction = property(_get_fraction,
+        doc='''Fraction of the resources that have finished loading, from
+        0.0 to 1.0.
+
+        :type: float
+        ''')
+
+    def done(self):
+        '''Determine if every resource has finished loading.
+
+        :rtype: bool
+        '''
+        return all(future.done() for future in self.futures)
+
+    def wait(self):
+        '''Finish loading every resource, blocking until they are decoded.
+
+        :rtype: list
+        :return: The loaded resources, in the order they were requested.
+        '''
+        return [future.result() for future in self.futures]
+
+def _decode_worker(jobs, decoded):
+    # Runs in the threads of a `Loader`, reading and decoding the files of
+    # `LoadFuture` objects and handing them back to the main thread through
+    # the `decoded` deque.
+    while True:
+        future, location, file_name = jobs.get()
+        try:
+            future._surface = pyglame.surface.load(file_name,
+                file=cStringIO.StringIO(location.buffer(file_name)))
+        except Exception, e:
+            future._exception = e
+        decoded.append(future)
+        future._decoded.set()
+
+class Bundle(object):
+    '''A group of resources loaded together by `Loader.load_bundle`.
+
+    :Ivariables:
+        `name` : str
+            Name of the bundle.
+        `images` : dict
+            Map of image name to the loaded image.
+        `files` : dict
+            Map of file name to the contents of the file, as a str.
+        `fonts` : list of str
+            Names of the fonts that were added to `pyglame.font`.
+
+    :since: pyglame 0.0.1
+    '''
+    def __init__(self, loader, name):
+        self.name = name
+        self.images = {}
+        self.files = {}
+        self.fonts = []
+        self._loader = loader
+
+    def unload(self):
+        '''Release the resources of the bundle.
+
+        Images are freed, and their atlas space reused, once nothing else
+        refers to them.  Fonts cannot be removed from `pyglame.font` and
+        stay available.
+        '''
+        self._loader.unload_bundle(self.name)
+
 class Loader(object):
     '''Load program resource files from disk.
 
     The loader contains a search path which can include filesystem
-    directories, ZIP archives and Python packages.
+    directories, ZIP archives, resource packs and Python packages.
 
     :Ivariables:
         `path` : list of str
@@ -270,9 +1211,47 @@ class Loader(object):
         `script_home` : str
             Base resource location, defaulting to the location of the
             application script.
+        `atlas_size` : int
+            Width and height that texture atlases start at.
+        `max_atlas_size` : int
+            Width and height texture atlases double up to as images are
+            added, before another atlas is created.
+        `index_cache` : str
+            File the index is saved to and reused from by `reindex`, or
+            None to scan the whole path every time.
+        `lazy` : bool
+            If True, directories are only listed when a resource in them
+            is looked up, instead of all of them by `reindex`.
+        `decode_threads` : int
+            Number of threads reading and decoding images for
+            `image_async`.
+        `load_budget` : float
+            Seconds per frame `finish_loads` spends packing images loaded
+            in the background.
+        `image_cache_size` : int
+            Estimated bytes of recently used images kept loaded after
+            nothing else refers to them, so that dropping an image briefly
+            doesn't make `image` load and pack it again.  Images in use are
+            always shared, regardless of this size.
+        `cache_hits` : int
+            Number of `image` and `image_async` calls that found the image
+            loaded.
+        `cache_misses` : int
+            Number of `image` and `image_async` calls that had to load the
+            image.
+        `cache_evictions` : int
+            Number of images the cache let go of to stay within
+            `image_cache_size`.
 
     '''
-    def __init__(self, path=None, script_home=None):
+    atlas_size = 128
+    max_atlas_size = 1024
+    decode_threads = 2
+    load_budget = 0.004
+    image_cache_size = 16 * 1024 * 1024
+
+    def __init__(self, path=None, script_home=None, index_cache=None,
+            lazy=False):
         '''Create a loader for the given path.
 
         If no path is specified it defaults to ``['.']``; that is, just the
@@ -286,6 +1265,12 @@ class Loader(object):
             `script_home` : str
                 Base location of relative files.  Defaults to the result of
                 `get_script_home`.
+            `index_cache` : str
+                File to keep the index in between runs, or None.  Relative
+                filenames are relative to `script_home`.
+            `lazy` : bool
+                If True, index directories as resources in them are looked
+                up, rather than all at once.
 
         '''
         if path is None:
@@ -293,6 +1278,8 @@ class Loader(object):
         if isinstance(path, (str, unicode)):
             path = [path]
         self.path = list(path)
+        self.index_cache = index_cache
+        self.lazy = lazy
         if script_home is None:
             script_home = get_script_home()
         self._script_home = script_home
@@ -301,18 +1288,112 @@ class Loader(object):
         # Map name to image
         # self._cached_textures = weakref.WeakValueDictionary()
         self._cached_images = weakref.WeakValueDictionary()
+
+        # The most recently used images, keeping up to `image_cache_size`
+        # bytes of them alive when nothing else refers to them.
+        self._recent_images = collections.OrderedDict()
+        self._recent_bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+
+        # Map atlas image name to the loaded atlas `Surface`.  Regions keep
+        # their atlas alive, so it is unloaded once none are in use.
+        self._baked_atlases = weakref.WeakValueDictionary()
         # self._cached_animations = weakref.WeakValueDictionary()
 
         # Map bin size to list of atlases
         self._texture_atlas_bins = {}
 
+        # Map image key to the `LoadFuture` of images loading in the
+        # background, and the futures decoded by the threads waiting to be
+        # finished on the main thread.
+        self._loading = {}
+        self._decoded = collections.deque()
+        self._decode_jobs = None
+
+        # Map bundle name to the loaded `Bundle`.
+        self._bundles = {}
+
     def reindex(self):
         '''Refresh the file index.
 
         You must call this method if `path` is changed or the filesystem
-        layout changes.
+        layout changes.  If `index_cache` is set, directories and ZIP files
+        that have not changed since the cache was written are not scanned
+        again.  If `lazy` is set, nothing is scanned until it is needed.
         '''
         self._index = {}
+        self._atlas_manifests = []
+        self._atlas_index = []
+
+        # Map location key to index entry, see `_scan_directory` and
+        # `_scan_archive`.
+        self._entries = {}
+        # Directories indexed so far, when lazy.
+        self._listed = set()
+        # Map location key to files by directory, for archives when lazy.
+        self._archive_listings = {}
+        self._locations = list(self._get_locations())
+
+        index_cache = self.index_cache
+        if index_cache and not os.path.isabs(index_cache):
+            index_cache = os.path.join(self._script_home, index_cache)
+        self._index_cache_path = index_cache
+        self._cached_entries = {}
+        if index_cache:
+            self._cached_entries = _load_index_cache(index_cache)
+        # Whether `_entries` has listings that aren't in the cache yet.
+        self._entries_changed = False
+
+        if self.lazy:
+            return
+
+        for key, location, archive_path in self._locations:
+            cached = self._cached_entries.get(key)
+            if archive_path is None:
+                entry = _scan_directory(location.path, cached)
+            else:
+                entry = _scan_archive(archive_path, location.dir, cached)
+            if entry is not None:
+                self._entries[key] = entry
+        self._build_index()
+
+        self._entries_changed = self._entries != self._cached_entries
+        self._save_index()
+
+    def _save_index(self):
+        # Write the index cache if anything was listed since it was last
+        # read or written.  Lazy loaders only list some directories, so the
+        # cached listings of the others are kept; they are checked against
+        # the modification time of their directory when used, as usual.
+        if not self._entries_changed:
+            return
+        self._entries_changed = False
+        if not self._index_cache_path:
+            return
+
+        entries = {}
+        for key, location, archive_path in self._locations:
+            entry = self._entries.get(key)
+            cached = self._cached_entries.get(key)
+            if self.lazy:
+                if entry is None:
+                    entry = cached
+                elif entry['type'] == 'dir' and \
+                        cached is not None and cached['type'] == 'dir':
+                    dirs = dict(cached['dirs'])
+                    dirs.update(entry['dirs'])
+                    entry = {'type': 'dir', 'dirs': dirs}
+            if entry is not None:
+                entries[key] = entry
+        _save_index_cache(self._index_cache_path, entries)
+        self._cached_entries = entries
+
+    def _get_locations(self):
+        # Yields ``(key, location, archive_path)`` for each entry of the
+        # path that exists.  `key` identifies the entry in the index cache,
+        # and `archive_path` is None for directories.
         for path in self.path:
             if path.startswith('@'):
                 # Module
@@ -339,49 +1420,246 @@ class Loader(object):
             if os.path.isdir(path):
                 # Filesystem directory
                 path = path.rstrip(os.path.sep)
-                location = FileLocation(path)
-                for dirpath, dirnames, filenames in os.walk(path):
-                    dirpath = dirpath[len(path) + 1:]
-                    # Force forward slashes for index
-                    if dirpath:
-                        parts = filter(None, dirpath.split(os.sep))
-                        dirpath = '/'.join(parts)
-                    for filename in filenames:
-                        if dirpath:
-                            index_name = dirpath + '/' + filename
-                        else:
-                            index_name = filename
-                        self._index_file(index_name, location)
+                yield path, FileLocation(path), None
             else:
-                # Find path component that is the ZIP file.
+                # Find path component that is the ZIP or pack file.
                 dir = ''
                 old_path = None
-                while path and not os.path.isfile(path):
-                    old_path = path
-                    path, tail_dir = os.path.split(path)
-                    if path == old_path:
+                archive_path = path
+                while archive_path and not os.path.isfile(archive_path):
+                    old_path = archive_path
+                    archive_path, tail_dir = os.path.split(archive_path)
+                    if archive_path == old_path:
                         break
                     dir = '/'.join((tail_dir, dir))
-                if path == old_path:
+                if archive_path == old_path or not archive_path:
                     continue
                 dir = dir.rstrip('/')
 
-                # path is a ZIP file, dir resides within ZIP
-                if path and zipfile.is_zipfile(path):
-                    zip = zipfile.ZipFile(path, 'r')
-                    location = ZIPLocation(zip, dir)
-                    for zip_name in zip.namelist():
-                        #zip_name_dir, zip_name = os.path.split(zip_name)
-                        #assert '\\' not in name_dir
-                        #assert not name_dir.endswith('/')
-                        if zip_name.startswith(dir):
-                            if dir:
-                                zip_name = zip_name[len(dir)+1:]
-                            self._index_file(zip_name, location)
+                # archive_path may be a ZIP or pack file, dir resides within
+                # it
+                yield path, _open_archive(archive_path, dir), archive_path
+
+    def _build_index(self):
+        for key, location, archive_path in self._locations:
+            entry = self._entries.get(key)
+            if entry is not None:
+                for name in _get_entry_names(entry):
+                    self._index_file(name, location)
+
+    def _get_filenames(self, key, location, archive_path, dirpath):
+        # Returns the files in a directory of a location, for lazy loaders.
+        # Directories are only listed the first time they are needed.
+        if archive_path is not None:
+            if key not in self._archive_listings:
+                cached = self._entries.get(key,
+                    self._cached_entries.get(key))
+                entry = _scan_archive(archive_path, location.dir, cached)
+                listings = {}
+                if entry is not None:
+                    if entry is not cached:
+                        self._entries_changed = True
+                    self._entries[key] = entry
+                    for name in entry['names']:
+                        parent, _, filename = name.rpartition('/')
+                        listings.setdefault(parent, []).append(filename)
+                self._archive_listings[key] = listings
+            return self._archive_listings[key].get(dirpath, ())
+
+        entry = self._entries.setdefault(key, {'type': 'dir', 'dirs': {}})
+        if dirpath not in entry['dirs']:
+            cached = self._cached_entries.get(key)
+            if cached is not None and cached['type'] == 'dir':
+                cached = cached['dirs'].get(dirpath)
+            else:
+                cached = None
+            listing = entry['dirs'][dirpath] = _list_directory(
+                location.path, dirpath, cached)
+            if listing is not cached:
+                self._entries_changed = True
+        listing = entry['dirs'][dirpath]
+        if listing is None:
+            return ()
+        return listing[1]
+
+    def _index_directory(self, dirpath):
+        # Index the files of a directory in every location.  The locations
+        # are listed in path order, so the first location holding a file
+        # wins, as when the whole path is indexed.
+        if dirpath in self._listed:
+            return
+        self._listed.add(dirpath)
+        for key, location, archive_path in self._locations:
+            for filename in self._get_filenames(
+                    key, location, archive_path, dirpath):
+                self._index_file(_join(dirpath, filename), location)
+
+    def _find(self, name):
+        # Index the directory holding `name`, and the directories above it,
+        # which may hold atlas manifests for it.
+        parts = name.split('/')
+        for i in range(len(parts)):
+            self._index_directory('/'.join(parts[:i]))
+        self._save_index()
+        return self._index.get(name)
+
+    def _index_all(self):
+        # Index every directory, for lazy loaders.
+        dirpaths = set([''])
+        for key, location, archive_path in self._locations:
+            if archive_path is None:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._cached_entries.get(key)
+                new_entry = self._entries[key] = \
+                    _scan_directory(location.path, entry)
+                if new_entry is not entry:
+                    self._entries_changed = True
+                dirpaths.update(new_entry['dirs'])
+            else:
+                self._get_filenames(key, location, archive_path, '')
+                dirpaths.update(self._archive_listings[key])
+        for dirpath in sorted(dirpaths):
+            self._index_directory(dirpath)
+        self._save_index()
+
+    def poll(self):
+        '''Update the index with changes to the files on the path.
+
+        Only directories that were indexed are checked, by comparing their
+        modification time, and only the ones that changed are listed again.
+        This is much cheaper than `reindex`, but changes to the path itself
+        still need a `reindex`.  If `index_cache` is set, it is updated with
+        the changes.
+
+        :rtype: bool
+        :return: True if any file was added or removed.
+        '''
+        changed = False
+        for i, (key, location, archive_path) in enumerate(self._locations):
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if archive_path is not None:
+                new_entry = _scan_archive(archive_path, location.dir, entry)
+                if new_entry is not entry:
+                    # The open archive has the old directory.
+                    self._locations[i] = (key,
+                        _open_archive(archive_path, location.dir),
+                        archive_path)
+                    self._archive_listings.pop(key, None)
+            elif self.lazy:
+                new_entry = _refresh_directories(location.path, entry)
+            else:
+                new_entry = _scan_directory(location.path, entry)
+
+            if new_entry is not entry:
+                changed = True
+                if new_entry is None:
+                    del self._entries[key]
+                else:
+                    self._entries[key] = new_entry
+
+        if changed:
+            self._index = {}
+            self._atlas_manifests = []
+            self._atlas_index = []
+            self._listed = set()
+            if not self.lazy:
+                self._build_index()
+            self._entries_changed = True
+            self._save_index()
+        return changed
+
+    def _poll(self, dt):
+        self.poll()
+
+    def watch(self, interval=1.0):
+        '''Keep the index up to date by calling `poll` periodically.
+
+        The polling is scheduled on the default `pyglame.clock`, which keeps
+        a reference to the loader until `unwatch` is called.
+
+        :Parameters:
+            `interval` : float
+                Seconds between polls.
+
+        '''
+        self.unwatch()
+        pyglame.clock.schedule_interval(self._poll, interval)
+
+    def unwatch(self):
+        '''Stop polling the path for changes.'''
+        pyglame.clock.unschedule(self._poll)
 
     def _index_file(self, name, location):
         if name not in self._index:
             self._index[name] = location
+            if name.endswith(('.atlas.json', '.atlas.bin')):
+                self._atlas_manifests.append(name)
+
+    def _get_atlas_index(self):
+        # Manifests are only read the first time an image is requested, and
+        # lazy loaders may find more of them later.
+        for name in self._atlas_manifests[len(self._atlas_index):]:
+            self._atlas_index.append(self._load_atlas_manifest(name))
+        return self._atlas_index
+
+    def _load_atlas_manifest(self, name):
+        # Returns the directory of the manifest and a mapping of image name
+        # to entry.  Binary manifests are looked up in place.
+        dir = name.rpartition('/')[0]
+        if dir:
+            dir += '/'
+
+        if name.endswith('.atlas.bin'):
+            from pyglame.surface import manifest
+            return dir, manifest.AtlasManifest(self.buffer(name))
+
+        images = json.load(self.file(name))['Images']
+        return dir, dict((image_name, tuple(entry))
+            for image_name, entry in images.items())
+
+    def _get_atlas_entry(self, name):
+        if self.lazy:
+            self._find(name)
+        for dir, images in self._get_atlas_index():
+            if name.startswith(dir):
+                entry = images.get(name[len(dir):])
+                if entry is not None:
+                    return (dir + entry[0],) + tuple(entry[1:])
+        return None
+
+    def _load_baked_image(self, name, untrim=False):
+        # Images the baker trimmed have their anchor set to the offset of
+        # the trimmed area.  They are rebuilt at their full size if they were
+        # rotated to fit the atlas, or if `untrim` is set.
+        entry = self._get_atlas_entry(name)
+        if entry is None:
+            return None
+
+        atlas_name, x, y, width, height = entry[:5]
+        atlas = self._baked_atlases.get(atlas_name)
+        if atlas is None:
+            file = cStringIO.StringIO(self.buffer(atlas_name))
+            atlas = self._baked_atlases[atlas_name] = pyglame.surface.load(
+                atlas_name, file=file)
+        img = atlas.get_region(x, y, width, height)
+        if len(entry) == 5:
+            return img
+
+        offset_x, offset_y, full_width, full_height, rotated = entry[5:]
+        if not (rotated or untrim):
+            img.anchor_x = offset_x
+            img.anchor_y = offset_y
+            return img
+
+        surface = img.surface
+        if rotated:
+            surface = pygame.transform.rotate(surface, 90)
+        img = pyglame.surface.Surface.create(full_width, full_height)
+        img.surface.blit(surface, (offset_x, offset_y))
+        return img
 
     def file(self, name, mode='rb'):
         '''Load a resource.
@@ -395,11 +1673,23 @@ class Loader(object):
 
         :rtype: file object
         '''
-        try:
-            location = self._index[name]
-            return location.open(name, mode)
-        except KeyError:
-            raise ResourceNotFoundException(name)
+        return self._get_location(name).open(name, mode)
+
+    def buffer(self, name):
+        '''Get the contents of a resource as a buffer.
+
+        Files on the filesystem, and files stored without compression in
+        ZIP files, are mapped into memory rather than read, so that large
+        resources are not copied.  See `Location.buffer`.
+
+        :Parameters:
+            `name` : str
+                Filename of the resource to read.
+
+        :rtype: buffer
+        :since: pyglame 0.0.1
+        '''
+        return self._get_location(name).buffer(name)
 
     def location(self, name):
         '''Get the location of a resource.
@@ -415,38 +1705,71 @@ class Loader(object):
 
         :rtype: `Location`
         '''
-        try:
-            return self._index[name]
-        except KeyError:
+        return self._get_location(name)
+
+    def _get_location(self, name):
+        location = self._index.get(name)
+        if location is None and self.lazy:
+            location = self._find(name)
+        if location is None:
             raise ResourceNotFoundException(name)
+        return location
 
     def list_all(self):
+        if self.lazy:
+            self._index_all()
         for name in self._index.keys():
             yield name
 
-    def _alloc_image(self, name, flip_x=False, flip_y=False, rotate=None):
-        file = self.file(name)
-        img = pyglame.surface.load(name, file=file)
-
+    def _alloc_image(self, name, flip_x=False, flip_y=False, rotate=None,
+            img=None, bins=None):
+        # `img` is the decoded image file, if it was loaded in the
+        # background or by `load_bundle`, and `bins` the atlas bins to use
+        # instead of the loader's.
+        transformed = flip_x or flip_y or rotate != None
+        if img is None:
+            img = self._load_baked_image(name, untrim=transformed)
+            if isinstance(img, pyglame.surface.SurfaceRegion) and \
+                    not transformed:
+                return img
+        if img is None and transformed:
+            # Flipped and rotated variants are made from the untransformed
+            # image, so the file is only decoded once for all of them.
+            img = self._get_base_image(name)
+        if img is None:
+            img = pyglame.surface.load(name,
+                file=cStringIO.StringIO(self.buffer(name)))
+
+        surface = img.surface
         if flip_x or flip_y:
-            img._surface = pygame.transform.flip(img._surface, flip_x, flip_y)
+            surface = pygame.transform.flip(surface, flip_x, flip_y)
 
         if rotate != None:
-            img._surface = pygame.transform.rotate(img._surface, rotate)
+            surface = pygame.transform.rotate(surface, rotate)
 
-        img.width  = img._surface.get_width()
-        img.height = img._surface.get_height()
+        if surface is not img.surface:
+            img = pyglame.surface.Surface(
+                surface.get_width(), surface.get_height(), surface)
 
-        bin = self._get_texture_atlas_bin(img.width, img.height)
+        bin = self._get_texture_atlas_bin(img.width, img.height, bins)
         if bin is None:
             return img
 
         return bin.add(img)
 
-    def _get_texture_atlas_bin(self, width, height):
+    def _get_base_image(self, name):
+        key = (name, False, False, None)
+        img = self._cached_images.get(key)
+        if img is None:
+            img = self._alloc_image(name)
+            self._cache_image(key, img)
+        return img
+
+    def _get_texture_atlas_bin(self, width, height, bins=None):
         '''A heuristic for determining the atlas bin to use for a given image
         size.  Returns None if the image should not be placed in an atlas (too
-        big), otherwise the bin (a list of SurfaceAtlas).
+        big), otherwise the bin (a list of SurfaceAtlas).  The bin is taken
+        from `bins` if given, a dict of bin size to bin.
         '''
         # Large images are not placed in an atlas
         if width > 128 or height > 128:
@@ -458,11 +1781,16 @@ class Loader(object):
         if height > 32:
             bin_size = 2
 
+        if bins is None:
+            bins = self._texture_atlas_bins
         try:
-            bin = self._texture_atlas_bins[bin_size]
+            bin = bins[bin_size]
         except KeyError:
-            bin = self._texture_atlas_bins[bin_size] = \
-                pyglame.surface.atlas.SurfaceBin(512, 512)
+            bin = bins[bin_size] = \
+                pyglame.surface.atlas.SurfaceBin(
+                    self.atlas_size, self.atlas_size,
+                    max_texture_width=self.max_atlas_size,
+                    max_texture_height=self.max_atlas_size)
 
         return bin
 
@@ -489,13 +1817,323 @@ class Loader(object):
             `SurfaceRegion` of a texture atlas.
         '''
         key = (name, flip_x, flip_y, rotate)
-        if key in self._cached_images:
-            identity = self._cached_images[key]
-        else:
-            identity = self._cached_images[key] = self._alloc_image(name, flip_x, flip_y, rotate)
+        identity = self._get_cached_image(key)
+        if identity is None:
+            identity = self._alloc_image(name, flip_x, flip_y, rotate)
+            self._cache_image(key, identity)
 
         return identity
 
+    def _get_cached_image(self, key):
+        img = self._cached_images.get(key)
+        if img is None:
+            self.cache_misses += 1
+            return None
+        self.cache_hits += 1
+        self._keep_image(key, img)
+        return img
+
+    def _cache_image(self, key, img):
+        self._cached_images[key] = img
+        self._keep_image(key, img)
+
+    def _keep_image(self, key, img):
+        # Images are estimated at four bytes per pixel, whether or not they
+        # share an atlas.  The least recently used are let go first.
+        entry = self._recent_images.pop(key, None)
+        if entry is not None:
+            self._recent_bytes -= entry[1]
+        size = img.width * img.height * 4
+        if size > self.image_cache_size:
+            return
+        self._recent_images[key] = (img, size)
+        self._recent_bytes += size
+        while self._recent_bytes > self.image_cache_size:
+            old_img, old_size = self._recent_images.popitem(last=False)[1]
+            self._recent_bytes -= old_size
+            self.cache_evictions += 1
+
+    def clear_cache(self):
+        '''Let go of the images kept alive by the cache.
+
+        Images still in use elsewhere stay cached until they are freed.
+
+        :since: pyglame 0.0.1
+        '''
+        self._recent_images.clear()
+        self._recent_bytes = 0
+
+    def load_bundle(self, name):
+        '''Load the resources listed in a bundle manifest.
+
+        The manifest is the resource ``<name>.bundle.json``, listing the
+        names of ``images``, ``fonts`` and raw ``files``, relative to the
+        directory of the manifest::
+
+            {
+                "images": ["tiles.png", "hero.png"],
+                "fonts": ["title.ttf"],
+                "files": ["map.tmx"]
+            }
+
+        The files are read together, grouped by location (see
+        `Location.read_files`).  Images are packed into atlases of their
+        own, tallest first, so that `unload_bundle` frees them as a unit,
+        and are also returned by `image` while they are in use.
+
+        Loading a bundle that is already loaded returns the same `Bundle`.
+
+        Each list may be left out.  A name may be listed more than once, and
+        in more than one list; each file is still read only once.
+
+        :Parameters:
+            `name` : str
+                Name of the bundle.
+
+        :rtype: `Bundle`
+        :since: pyglame 0.0.1
+        '''
+        bundle = self._bundles.get(name)
+        if bundle is not None:
+            return bundle
+
+        manifest_name = name + '.bundle.json'
+        manifest = json.load(self.file(manifest_name))
+        if not isinstance(manifest, dict):
+            raise ValueError(
+                'Bundle manifest "%s" is not a JSON object' % manifest_name)
+        dir = name.rpartition('/')[0]
+        if dir:
+            dir += '/'
+        image_names = _get_bundle_names(manifest_name, manifest, 'images', dir)
+        font_names = _get_bundle_names(manifest_name, manifest, 'fonts', dir)
+        file_names = _get_bundle_names(manifest_name, manifest, 'files', dir)
+
+        bundle = Bundle(self, name)
+        bins = {}
+        key = lambda image_name: (image_name, False, False, None)
+        decode = []
+        for image_name in image_names:
+            img = self._cached_images.get(key(image_name))
+            if img is None and self._get_atlas_entry(image_name) is not None:
+                # Baked images only need their atlas image loaded.
+                img = self._cached_images[key(image_name)] = \
+                    self._alloc_image(image_name, bins=bins)
+            if img is not None:
+                bundle.images[image_name] = img
+            else:
+                decode.append(image_name)
+
+        data = self._read_files(
+            _unique_names(decode + font_names + file_names))
+
+        decoded = []
+        for image_name in decode:
+            decoded.append((image_name, pyglame.surface.load(image_name,
+                file=StringIO.StringIO(data[image_name]))))
+        # Packing the tallest images first leaves the least space unused in
+        # the rows of the allocator.
+        decoded.sort(key=lambda (image_name, img): (-img.height, -img.width))
+        for image_name, img in decoded:
+            img = self._alloc_image(image_name, img=img, bins=bins)
+            bundle.images[image_name] = \
+                self._cached_images[key(image_name)] = img
+
+        if font_names:
+            from pyglame import font
+            for font_name in font_names:
+                font.add_file(StringIO.StringIO(data[font_name]))
+                bundle.fonts.append(font_name)
+
+        for file_name in file_names:
+            bundle.files[file_name] = data[file_name]
+        self._bundles[name] = bundle
+        return bundle
+
+    def unload_bundle(self, name):
+        '''Release the resources of a bundle loaded by `load_bundle`.
+
+        :Parameters:
+            `name` : str
+                Name of the bundle.
+
+        :since: pyglame 0.0.1
+        '''
+        bundle = self._bundles.pop(name, None)
+        if bundle is not None:
+            # Images fetched through `image` are also kept alive by the
+            # cache of recent images, which would keep their atlas loaded.
+            for image_name in bundle.images:
+                entry = self._recent_images.pop(
+                    (image_name, False, False, None), None)
+                if entry is not None:
+                    self._recent_bytes -= entry[1]
+            bundle.images.clear()
+            bundle.files.clear()
+
+    def _read_files(self, names):
+        # Returns a dict of name to contents, reading the files of each
+        # location with one `Location.read_files` call.
+        by_location = collections.OrderedDict()
+        for name in names:
+            location = self._get_location(name)
+            by_location.setdefault(location, []).append(name)
+        data = {}
+        for location, location_names in by_location.items():
+            data.update(location.read_files(location_names))
+        return data
+
+    def image_async(self, name, flip_x=False, flip_y=False, rotate=None):
+        '''Load an image in the background.
+
+        The file is read and decoded by one of the loader's threads, and
+        the image is packed into an atlas on the main thread by
+        `finish_loads`, which is scheduled on `pyglame.clock` while loads
+        are pending.  Requesting an image that is already loading returns
+        the same future.
+
+        :Parameters:
+            `name` : str
+                Filename of the image source to load.
+            `flip_x` : bool
+                If True, the returned image will be flipped horizontally.
+            `flip_y` : bool
+                If True, the returned image will be flipped vertically.
+            `rotate` : float
+                The returned image will be rotated clockwise by the given
+                number of degrees.
+
+        :rtype: `LoadFuture`
+        :since: pyglame 0.0.1
+        '''
+        key = (name, flip_x, flip_y, rotate)
+        future = self._loading.get(key)
+        if future is not None:
+            return future
+
+        future = LoadFuture(self, name)
+        future._key = key
+        img = self._get_cached_image(key)
+        if img is not None:
+            future._set_result(img)
+            return future
+
+        # Index lookups happen here, so that the threads only read files.
+        try:
+            entry = self._get_atlas_entry(name)
+            file_name = name
+            if entry is not None:
+                file_name = entry[0]
+            location = self._get_location(file_name)
+        except ResourceNotFoundException, e:
+            future._set_result(None, e)
+            return future
+
+        if not self._loading:
+            pyglame.clock.schedule(self._finish_loads)
+        self._loading[key] = future
+
+        future._baked = entry is not None
+        if entry is not None:
+            future._surface = self._baked_atlases.get(file_name)
+        elif flip_x or flip_y or rotate != None:
+            future._surface = self._cached_images.get(
+                (name, False, False, None))
+        else:
+            future._surface = None
+        if future._surface is not None:
+            # The atlas image, or the untransformed image to make the
+            # variant from, is loaded already.
+            future._decoded.set()
+            self._decoded.append(future)
+        else:
+            self._start_decoding(future, location, file_name)
+        return future
+
+    def prefetch(self, names):
+        '''Load several images in the background.
+
+        :Parameters:
+            `names` : list of str
+                Filenames of the images to load.
+
+        :rtype: `LoadProgress`
+        :since: pyglame 0.0.1
+        '''
+        return LoadProgress([self.image_async(name) for name in names])
+
+    def _start_decoding(self, future, location, file_name):
+        if self._decode_jobs is None:
+            self._decode_jobs = Queue.Queue()
+            for i in range(self.decode_threads):
+                thread = threading.Thread(target=_decode_worker,
+                    args=(self._decode_jobs, self._decoded))
+                thread.daemon = True
+                thread.start()
+        self._decode_jobs.put((future, location, file_name))
+
+    def finish_loads(self, budget=None):
+        '''Finish images decoded in the background.
+
+        Decoded images are packed into atlases until `budget` seconds have
+        passed, so that loading doesn't cause a hitch; the rest are left for
+        the next call.  At least one image is finished per call.  This is
+        called every frame while loads are pending, so it only needs to be
+        called directly when `pyglame.clock` isn't ticked.
+
+        :Parameters:
+            `budget` : float
+                Seconds to spend, or None to use `load_budget`.
+
+        :rtype: int
+        :return: The number of images still loading.
+        :since: pyglame 0.0.1
+        '''
+        if budget is None:
+            budget = self.load_budget
+        start = time.time()
+        while self._decoded:
+            self._finish(self._decoded.popleft())
+            if time.time() - start >= budget:
+                break
+        return len(self._loading)
+
+    def _finish_loads(self, dt):
+        self.finish_loads()
+
+    def _finish(self, future):
+        if future.done():
+            return
+        key = future._key
+        del self._loading[key]
+        if not self._loading:
+            pyglame.clock.unschedule(self._finish_loads)
+
+        if future._exception is not None:
+            future._set_result(None, future._exception)
+            return
+
+        name, flip_x, flip_y, rotate = key
+        decoded, future._surface = future._surface, None
+        img = self._cached_images.get(key)
+        try:
+            if img is None:
+                source = decoded
+                if future._baked:
+                    # The atlas is only weakly referenced by the loader, so
+                    # `decoded` keeps it alive until the region is taken.
+                    atlas_name = self._get_atlas_entry(name)[0]
+                    if atlas_name not in self._baked_atlases:
+                        self._baked_atlases[atlas_name] = decoded
+                    source = None
+                img = self._alloc_image(
+                    name, flip_x, flip_y, rotate, source)
+                self._cache_image(key, img)
+        except Exception, e:
+            future._set_result(None, e)
+        else:
+            future._set_result(img)
+
 
 
 
@@ -509,6 +2147,18 @@ class Loader(object):
 #: :type: list of str
 path = []
 
+#: File the default loader keeps its index in between runs, or None.
+#: After changing it you must call `reindex`.
+#:
+#: :type: str
+index_cache = None
+
+#: If True, the default loader only indexes directories as resources in
+#: them are looked up.  After changing it you must call `reindex`.
+#:
+#: :type: bool
+lazy = False
+
 class _DefaultLoader(Loader):
     def _get_path(self):
         return path
@@ -519,9 +2169,37 @@ class _DefaultLoader(Loader):
 
     path = property(_get_path, _set_path)
 
+    def _get_index_cache(self):
+        return index_cache
+
+    def _set_index_cache(self, value):
+        global index_cache
+        index_cache = value
+
+    index_cache = property(_get_index_cache, _set_index_cache)
+
+    def _get_lazy(self):
+        return lazy
+
+    def _set_lazy(self, value):
+        global lazy
+        lazy = value
+
+    lazy = property(_get_lazy, _set_lazy)
+
 _default_loader = _DefaultLoader()
 reindex         = _default_loader.reindex
 file            = _default_loader.file
+buffer          = _default_loader.buffer
 location        = _default_loader.location
 image           = _default_loader.image
 list_all        = _default_loader.list_all
+poll            = _default_loader.poll
+watch           = _default_loader.watch
+unwatch         = _default_loader.unwatch
+image_async     = _default_loader.image_async
+prefetch        = _default_loader.prefetch
+finish_loads    = _default_loader.finish_loads
+load_bundle     = _default_loader.load_bundle
+unload_bundle   = _default_loader.unload_bundle
+clear_cache     = _default_loader.clear_cache
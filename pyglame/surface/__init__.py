@@ -68,14 +68,22 @@ the memory is shared efficiently)::
 
     subimage = pic.get_region(x, y, width, height)
 
+If NumPy is installed, the pixel data of an image or region can be accessed
+directly; the returned arrays share memory with the image::
+
+    rgb = subimage.get_pixels()
+    alpha = subimage.get_pixels_alpha()
+
 '''
 
 __docformat__ = 'restructuredtext'
 __version__ = '$Id: __init__.py 2541 2009-12-31 04:31:11Z benjamin.coder.smith@gmail.com $'
 
+import abc
 import sys
 import re
 import weakref
+import collections
 
 from ctypes import *
 from StringIO import StringIO
@@ -86,6 +94,11 @@ from pyglame.surface import atlas
 
 import pygame
 
+try:
+    import pygame.surfarray as _surfarray
+except ImportError:
+    _surfarray = None
+
 class SurfaceException(Exception):
     pass
 
@@ -127,6 +140,8 @@ class AbstractSurface(object):
         `anchor_y` : int
             Y coordinate of anchor, relative to top edge of image data
     '''
+    __slots__ = ()
+
     anchor_x = 0
     anchor_y = 0
     x = 0
@@ -183,6 +198,52 @@ class AbstractSurface(object):
         :type: `pygame.Surface`
         ''')
 
+    def get_pixels(self):
+        '''Get a NumPy array referencing the colour data of this image.
+
+        The array has the shape ``(width, height, 3)`` and shares memory with
+        the underlying pygame.Surface, so changes made to it are reflected in
+        the image.  The surface stays locked for as long as the array (or any
+        view of it) is alive.
+
+        :rtype: `numpy.ndarray`
+
+        :since: pyglame 0.0.1
+        '''
+        raise SurfaceException('Cannot retrieve pixel data for %r' % self)
+
+    def get_pixels_alpha(self):
+        '''Get a NumPy array referencing the alpha channel of this image.
+
+        The array has the shape ``(width, height)`` and shares memory with the
+        underlying pygame.Surface, which must have per-pixel alpha.
+
+        :rtype: `numpy.ndarray`
+
+        :since: pyglame 0.0.1
+        '''
+        raise SurfaceException('Cannot retrieve alpha data for %r' % self)
+
+    pixels = property(lambda self: self.get_pixels(),
+        doc='''A NumPy array referencing the colour data of this image.
+
+        :since: pyglame 0.0.1
+
+        :type: `numpy.ndarray`
+        ''')
+
+    def get_blit_source(self):
+        '''Get the pygame.Surface and area to blit this image from.
+
+        Regions return their parent's surface together with their rectangle,
+        so drawing them does not need a subsurface.
+
+        :rtype: (`pygame.Surface`, `pygame.Rect` or None)
+
+        :since: pyglame 0.0.1
+        '''
+        return self.surface, None
+
     def get_region(self, x, y, width, height):
         '''Retrieve a rectangular region of this image.
 
@@ -240,6 +301,8 @@ def _is_pow2(v):
 
 
 class Surface(AbstractSurface):
+    # `SurfaceRegion` is registered as a virtual subclass, see below.
+    __metaclass__ = abc.ABCMeta
 
     def __init__(self, width, height, surface):
         super(Surface, self).__init__(width, height)
@@ -277,6 +340,16 @@ class Surface(AbstractSurface):
     def get_surface(self):
         return self._surface
 
+    def get_pixels(self):
+        if _surfarray is None:
+            raise SurfaceException('NumPy is required for pixel access.')
+        return _surfarray.pixels3d(self.surface)
+
+    def get_pixels_alpha(self):
+        if _surfarray is None:
+            raise SurfaceException('NumPy is required for pixel access.')
+        return _surfarray.pixels_alpha(self.surface)
+
     def blit_into(self, surface, x, y, area=None):
         draw.blit_into(self, surface, x, y, area)
 
@@ -288,34 +361,241 @@ class DisplaySurface(Surface):
     def get_region(self, x, y, width, height):
         raise SurfaceException('Unable to create SurfaceRegion from a DisplaySurface.')
 
-class SurfaceRegion(Surface):
+class SurfaceRegion(AbstractSurface):
     '''A rectangular region of a texture, presented as if it were
     a separate texture.
+
+    A region only stores its parent and rectangle; the pygame.Surface
+    returned by `get_surface` is created on first use.  A region of a region
+    draws from the `Surface` of the region it was taken from, and follows it
+    if it is moved (see `pyglame.surface.atlas.SurfaceBin.compact`).
+
+    `x`, `y` and `parent` are relative to the image the region was taken
+    from, which may itself be a region; `abs_x`, `abs_y` and `abs_parent`
+    give the position in the underlying `Surface`.
+
+    Regions don't derive from `Surface`, so that they don't need an instance
+    dictionary, but are registered as a virtual subclass of it, so
+    ``isinstance(region, Surface)`` is still true.
     '''
+    __slots__ = ('_x', '_y', '_parent', '_owner', '_surface',
+                 'width', 'height', 'anchor_x', 'anchor_y', '__weakref__')
 
     def __init__(self, x, y, width, height, parent):
-        self._x      = x
-        self._y      = y
-        self._parent = parent
+        # A region of a region is stored relative to the region it was taken
+        # from, and keeps it alive, as an atlas frees the space of its
+        # regions once they are collected.
+        if isinstance(parent, SurfaceRegion):
+            self._owner  = parent
+            self._parent = None
+        else:
+            self._owner  = None
+            self._parent = parent
+
+        self._x        = x
+        self._y        = y
+        self._surface  = None
+        self.width     = width
+        self.height    = height
+        self.anchor_x  = 0
+        self.anchor_y  = 0
+
+    def _relocate(self, parent, x, y):
+        # Used by atlases to move the pixels of a region elsewhere.
+        assert self._owner is None
+        self._parent  = parent
+        self._x       = x
+        self._y       = y
+        self._surface = None
+
+    def _get_abs_rect(self):
+        return pygame.Rect(self.abs_x, self.abs_y, self.width, self.height)
+
+    def get_surface(self):
+        if self._owner is not None:
+            return self.abs_parent.surface.subsurface(self._get_abs_rect())
+        if self._surface is None:
+            self._surface = self._parent.surface.subsurface(
+                (self._x, self._y, self.width, self.height))
+        return self._surface
+
+    def get_blit_source(self):
+        return self.abs_parent.surface, self._get_abs_rect()
 
-        self._abs_x      = x
-        self._abs_y      = y
-        self._abs_parent = parent
+    def get_pixels(self):
+        # Slice the parent view rather than creating a subsurface.
+        x, y = self.abs_x, self.abs_y
+        pixels = self.abs_parent.get_pixels()
+        return pixels[x:x + self.width, y:y + self.height]
 
-        while isinstance(self.abs_parent, SurfaceRegion):
-            self._abs_x      += self._abs_parent.x
-            self._abs_y      += self._abs_parent.y
-            self._abs_parent  = self._abs_parent.parent
+    def get_pixels_alpha(self):
+        x, y = self.abs_x, self.abs_y
+        pixels = self.abs_parent.get_pixels_alpha()
+        return pixels[x:x + self.width, y:y + self.height]
 
-        new_surface = parent.surface.subsurface((x, y, width, height))
+    def blit_into(self, surface, x, y, area=None):
+        draw.blit_into(self, surface, x, y, area)
+
+    def get_region(self, x, y, width, height):
+        return SurfaceRegion(x, y, width, height, self)
 
-        super(SurfaceRegion, self).__init__(
-            width, height, new_surface)
+    def _get_parent(self):
+        if self._owner is None:
+            return self._parent
+        return self._owner
+
+    def _get_abs_x(self):
+        if self._owner is None:
+            return self._x
+        return self._owner.abs_x + self._x
+
+    def _get_abs_y(self):
+        if self._owner is None:
+            return self._y
+        return self._owner.abs_y + self._y
+
+    def _get_abs_parent(self):
+        if self._owner is None:
+            return self._parent
+        return self._owner.abs_parent
 
     x      = property(lambda self: self._x)
     y      = property(lambda self: self._y)
-    parent = property(lambda self: self._parent)
+    parent = property(_get_parent)
+
+    abs_x      = property(_get_abs_x)
+    abs_y      = property(_get_abs_y)
+    abs_parent = property(_get_abs_parent)
+
+Surface.register(SurfaceRegion)
+
+
+class SurfacePool(object):
+    '''Recycles surfaces used as temporary render targets.
+
+    Surfaces are pooled by size bucket (each dimension rounded up to a power
+    of 2), depth and flags.  Once the pool has warmed up, `acquire` returns
+    previously released surfaces instead of allocating new ones::
+
+        pool = SurfacePool()
+        target = pool.acquire(100, 60)
+        # ... draw into target ...
+        pool.release(target)
+
+    :Ivariables:
+        `max_bytes` : int or None
+            Upper bound on the memory held by idle surfaces.  The surfaces
+            released longest ago are dropped first.
+        `pooled_bytes` : int
+            Memory currently held by idle surfaces.
+        `peak_bytes` : int
+            Highest value `pooled_bytes` has reached.
+        `allocations` : int
+            Number of surfaces the pool has had to create.
+
+    '''
+    def __init__(self, max_bytes=None):
+        '''Create an empty pool.
+
+        :Parameters:
+            `max_bytes` : int or None
+                Upper bound on the memory held by idle surfaces, or None for
+                no limit.
+
+        '''
+        self.max_bytes = max_bytes
+        self.pooled_bytes = 0
+        self.peak_bytes = 0
+        self.allocations = 0
+
+        # Map key to list of idle surfaces, most recently released last.
+        self._buckets = {}
+        # Idle surfaces in the order they were released.
+        self._released = collections.OrderedDict()
+        # Surfaces handed out by `acquire`.
+        self._acquired = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _get_bytes(image):
+        return image.width * image.height * image.surface.get_bytesize()
+
+    def acquire(self, width, height, depth=32, flags=pygame.SRCALPHA,
+            clear=True):
+        '''Get a surface of at least the given size.
+
+        :Parameters:
+            `width` : int
+                Width of the render target.
+            `height` : int
+                Height of the render target.
+            `depth` : int
+                Depth of the render target.
+            `flags` : int
+                pygame.Surface flags of the render target.
+            `clear` : bool
+                If True, the render target is filled with transparent black.
+
+        :rtype: `Surface` or `SurfaceRegion`
+        :return: A `Surface` if both dimensions are a power of 2, otherwise
+            a `SurfaceRegion` of a pooled `Surface`.
+        '''
+        key = (_nearest_pow2(width), _nearest_pow2(height), depth, flags)
+
+        bucket = self._buckets.get(key)
+        if bucket:
+            image = bucket.pop()
+            del self._released[image]
+            self.pooled_bytes -= self._get_bytes(image)
+        else:
+            image = Surface(key[0], key[1],
+                pygame.Surface((key[0], key[1]), flags, depth))
+            self.allocations += 1
+
+        self._acquired[image] = key
+
+        if clear:
+            image.surface.fill((0, 0, 0, 0), (0, 0, width, height))
+
+        if width == key[0] and height == key[1]:
+            return image
+        return image.get_region(0, 0, width, height)
+
+    def release(self, image):
+        '''Return a surface obtained from `acquire` to the pool.
+
+        The surface (and any region of it) must not be used afterwards.
+
+        :Parameters:
+            `image` : `Surface` or `SurfaceRegion`
+                The render target to release.
+
+        '''
+        if isinstance(image, SurfaceRegion):
+            image = image.abs_parent
+
+        try:
+            key = self._acquired.pop(image)
+        except KeyError:
+            raise SurfaceException(
+                '%r was not acquired from this pool' % image)
+
+        self._buckets.setdefault(key, []).append(image)
+        self._released[image] = key
+        self.pooled_bytes += self._get_bytes(image)
+        self.peak_bytes = max(self.peak_bytes, self.pooled_bytes)
 
-    abs_x      = property(lambda self: self._abs_x)
-    abs_y      = property(lambda self: self._abs_y)
-    abs_parent = property(lambda self: self._abs_parent)
+        if self.max_bytes is not None:
+            self.trim(self.max_bytes)
+
+    def trim(self, max_bytes=0):
+        '''Drop idle surfaces until at most `max_bytes` are pooled.
+
+        :Parameters:
+            `max_bytes` : int
+                Memory to keep; by default every idle surface is dropped.
+
+        '''
+        while self.pooled_bytes > max_bytes and self._released:
+            image, key = self._released.popitem(last=False)
+            self._buckets[key].remove(image)
+            self.pooled_bytes -= self._get_bytes(image)
@@ -49,11 +49,28 @@ Example usage::
     car_texture = bin.add(car_image)
     boat_texture = bin.add(boat_image)
 
+The packing strategy is chosen with the ``allocator`` argument; the default
+strip `Allocator` is fastest when images are added in decreasing height
+order, while `MaxRectsAllocator`, `SkylineAllocator` and `GuillotineAllocator`
+cope better with mixed sizes::
+
+    bin = SurfaceBin(allocator='maxrects')
+
+Atlases can also start small and double in size as images are added, which
+keeps the number of distinct textures down::
+
+    bin = SurfaceBin(128, 128, max_texture_width=1024, max_texture_height=1024)
+
+Images that are mostly transparent padding can be trimmed to the bounding
+box of their visible pixels, and identical images can share one region::
+
+    frame = bin.add(frame_image, trim=True, dedup=True)
+
 The result of `SurfaceBin.add` is a `SurfaceRegion` containing the image.
-Once added, an image cannot be removed from a bin (or an atlas); nor can a
-list of images be obtained from a given bin or atlas -- it is the
-application's responsibility to keep track of the regions returned by the
-``add`` methods.
+The space used by an image is given back to its atlas when the region is
+garbage collected, or straight away with `SurfaceBin.free`.  A list of images
+cannot be obtained from a given bin or atlas -- it is the application's
+responsibility to keep track of the regions returned by the ``add`` methods.
 
 :since: pyglame 0.0.1
 '''
@@ -61,7 +78,15 @@ application's responsibility to keep track of the regions returned by the
 __docformat__ = 'restructuredtext'
 __version__ = '$Id$'
 
+import bisect
+import collections
+import hashlib
+import weakref
+
+import pygame
+
 import pyglame
+from pyglame import clock
 from pyglame import draw
 
 
@@ -89,18 +114,18 @@ class _Strip(object):
     def compact(self):
         self.max_height = self.y2 - self.y
 
-class Allocator(object):
+class AbstractAllocator(object):
     '''Rectangular area allocation algorithm.
 
     Initialise with a given ``width`` and ``height``, then repeatedly
     call `alloc` to retrieve free regions of the area and protect that
     area from future allocations.
 
-    `Allocator` uses a fairly simple strips-based algorithm.  It performs best
-    when rectangles are allocated in decreasing height order.
+    Subclasses implement different packing strategies behind the same
+    interface; see `allocators`.
     '''
     def __init__(self, width, height):
-        '''Create an `Allocator` of the given size.
+        '''Create an allocator of the given size.
 
         :Parameters:
             `width` : int
@@ -112,8 +137,10 @@ class Allocator(object):
         assert width > 0 and height > 0
         self.width = width
         self.height = height
-        self.strips = [_Strip(0, height)]
-        self.used_area = 0
+        self.clear()
+
+    def __repr__(self):
+        return '<%s %dx%d>' % (self.__class__.__name__, self.width, self.height)
 
     def alloc(self, width, height):
         '''Get a free area in the allocator of the given size.
@@ -129,23 +156,112 @@ class Allocator(object):
                 Height of the area to allocate.
 
         :rtype: int, int
-        :return: The X and Y coordinates of the bottom-left corner of the
+        :return: The X and Y coordinates of the top-left corner of the
             allocated region.
         '''
-        for strip in self.strips:
-            if self.width - strip.x >= width and strip.max_height >= height:
-                self.used_area += width * height
-                return strip.add(width, height)
+        raise NotImplementedError('abstract')
 
-        if self.width >= width and self.height - strip.y2 >= height:
-            self.used_area += width * height
-            strip.compact()
-            newstrip = _Strip(strip.y2, self.height - strip.y2)
-            self.strips.append(newstrip)
-            return newstrip.add(width, height)
+    def can_fit(self, width, height):
+        '''Determine if an area of the given size can be allocated.
 
-        raise AllocatorException('No more space in %r for box %dx%d' % (
-                self, width, height))
+        This is much cheaper than catching the `AllocatorException` raised
+        by `alloc`.
+
+        :Parameters:
+            `width` : int
+                Width of the area.
+            `height` : int
+                Height of the area.
+
+        :rtype: bool
+        '''
+        max_width, max_height = self.get_max_free_size()
+        if width > max_width or height > max_height:
+            return False
+        return self._fits(width, height)
+
+    def get_max_free_size(self):
+        '''Get an upper bound on the size of area that can be allocated.
+
+        No area wider or taller than the returned size can be allocated,
+        though not every area within it necessarily can.  The result is
+        cached until the allocator changes.
+
+        :rtype: int, int
+        '''
+        if self._max_free is None:
+            self._max_free = self._get_max_free_size()
+        return self._max_free
+
+    def _fits(self, width, height):
+        raise NotImplementedError('abstract')
+
+    def _get_max_free_size(self):
+        raise NotImplementedError('abstract')
+
+    def _get_free_sizes(self):
+        # Sizes of area such that an area fits if it is no larger than one
+        # of them.  Allocators that can't tell give an upper bound.
+        return [self.get_max_free_size()]
+
+    def free(self, x, y, width, height):
+        '''Return a previously allocated area to the allocator.
+
+        Allocators that cannot reuse space in the middle of the allocation
+        region only reclaim it once every allocated area has been freed.
+
+        :Parameters:
+            `x` : int
+                X coordinate returned by `alloc`.
+            `y` : int
+                Y coordinate returned by `alloc`.
+            `width` : int
+                Width passed to `alloc`.
+            `height` : int
+                Height passed to `alloc`.
+
+        :rtype: bool
+        :return: True if the allocator is now empty.
+        '''
+        self.used_area -= width * height
+        self._max_free = None
+        assert self.used_area >= 0
+        if not self.used_area:
+            self.clear()
+            return True
+        return False
+
+    def resize(self, width, height):
+        '''Grow the allocation region.
+
+        Areas already allocated keep their position.
+
+        :Parameters:
+            `width` : int
+                New width, no smaller than the current width.
+            `height` : int
+                New height, no smaller than the current height.
+
+        '''
+        assert width >= self.width and height >= self.height
+        self.width = width
+        self.height = height
+        self._max_free = None
+
+    #: True if areas given to `free` can be allocated again before the
+    #: allocator is empty.
+    reuses_space = False
+
+    def clear(self):
+        '''Forget every allocated area.'''
+        self.used_area = 0
+        self.used_height = 0
+        self._max_free = None
+
+    def _add_used(self, rect):
+        self.used_area += rect[2] * rect[3]
+        self.used_height = max(self.used_height, rect[1] + rect[3])
+        self._max_free = None
 
     def get_usage(self):
         '''Get the fraction of area already allocated.
@@ -164,30 +280,502 @@ class Allocator(object):
 
         :rtype: float
         '''
+        # The unused area above the lowest allocated edge.
+        if not self.used_height:
+            return 0.
+        possible_area = self.used_height * self.width
+        return 1.0 - self.used_area / float(possible_area)
+
+class Allocator(AbstractAllocator):
+    '''Rectangular area allocator using strips.
+
+    `Allocator` uses a fairly simple strips-based algorithm.  It performs best
+    when rectangles are allocated in decreasing height order.  Freed areas are
+    only reclaimed once the allocator is empty.
+    '''
+    def clear(self):
+        super(Allocator, self).clear()
+        self.strips = [_Strip(0, self.height)]
+
+    def resize(self, width, height):
+        # Only the last strip is open; the others have been compacted.
+        self.strips[-1].max_height += height - self.height
+        super(Allocator, self).resize(width, height)
+
+    def alloc(self, width, height):
+        for strip in self.strips:
+            if self.width - strip.x >= width and strip.max_height >= height:
+                x, y = strip.add(width, height)
+                self._add_used((x, y, width, height))
+                return x, y
+
+        if self.width >= width and self.height - strip.y2 >= height:
+            strip.compact()
+            newstrip = _Strip(strip.y2, self.height - strip.y2)
+            self.strips.append(newstrip)
+            x, y = newstrip.add(width, height)
+            self._add_used((x, y, width, height))
+            return x, y
+
+        raise AllocatorException('No more space in %r for box %dx%d' % (
+                self, width, height))
+
+    def _fits(self, width, height):
+        for strip in self.strips:
+            if self.width - strip.x >= width and strip.max_height >= height:
+                return True
+        return (self.width >= width and
+                self.height - self.strips[-1].y2 >= height)
+
+    def _get_free_sizes(self):
+        sizes = [(self.width - strip.x, strip.max_height)
+            for strip in self.strips]
+        sizes.append((self.width, self.height - self.strips[-1].y2))
+        return sizes
+
+    def _get_max_free_size(self):
+        # The last strip is open, so its height covers a new strip too.
+        if self.height > self.strips[-1].y2:
+            width = self.width
+        else:
+            width = max(self.width - strip.x for strip in self.strips)
+        return width, max(strip.max_height for strip in self.strips)
+
+    def get_fragmentation(self):
         # The total unused area in each compacted strip is summed.
-        if not self.strips:
+        if not self.strips[-1].y2:
             return 0.
         possible_area = self.strips[-1].y2 * self.width
         return 1.0 - self.used_area / float(possible_area)
 
+def _contains(a, b):
+    # True if rectangle `a` contains rectangle `b`, both (x, y, w, h).
+    return (a[0] <= b[0] and a[1] <= b[1] and
+            a[0] + a[2] >= b[0] + b[2] and a[1] + a[3] >= b[1] + b[3])
+
+def _coalesce(rects):
+    # Merge rectangles sharing a whole edge until no more can be merged.
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            x, y, w, h = rects[i]
+            for j in range(i + 1, len(rects)):
+                ox, oy, ow, oh = rects[j]
+                if x == ox and w == ow and (y + h == oy or oy + oh == y):
+                    rects[i] = (x, min(y, oy), w, h + oh)
+                elif y == oy and h == oh and (x + w == ox or ox + ow == x):
+                    rects[i] = (min(x, ox), y, w + ow, h)
+                else:
+                    continue
+                del rects[j]
+                merged = True
+                break
+            if merged:
+                break
+    return rects
+
+def _overlaps(a, b):
+    # True if rectangles `a` and `b` share some area.
+    return (a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and
+            a[1] < b[1] + b[3] and b[1] < a[1] + a[3])
+
+def _cut(rects, used):
+    # Splits `rects` around the rectangle `used`, as `MaxRectsAllocator`
+    # does when it places one.
+    ux, uy, uw, uh = used
+    result = []
+    for rect in rects:
+        if not _overlaps(rect, used):
+            result.append(rect)
+            continue
+        x, y, w, h = rect
+        if ux > x:
+            result.append((x, y, ux - x, h))
+        if ux + uw < x + w:
+            result.append((ux + uw, y, x + w - ux - uw, h))
+        if uy > y:
+            result.append((x, y, w, uy - y))
+        if uy + uh < y + h:
+            result.append((x, uy + uh, w, y + h - uy - uh))
+    return result
+
+def _prune(rects):
+    # Remove rectangles contained in another (keeping one of equal ones).
+    return [rect for i, rect in enumerate(rects)
+        if not any(_contains(other, rect) and (other != rect or j < i)
+            for j, other in enumerate(rects) if j != i)]
+
+class _FreeRectsAllocator(AbstractAllocator):
+    # Base of allocators that track their free space in `free_rects`.
+    reuses_space = True
+
+    def clear(self):
+        super(_FreeRectsAllocator, self).clear()
+        self.free_rects = [(0, 0, self.width, self.height)]
+
+    def _fits(self, width, height):
+        for rect in self.free_rects:
+            if rect[2] >= width and rect[3] >= height:
+                return True
+        return False
+
+    def _get_max_free_size(self):
+        return (max([rect[2] for rect in self.free_rects] or [0]),
+                max([rect[3] for rect in self.free_rects] or [0]))
+
+    def _get_free_sizes(self):
+        return [(rect[2], rect[3]) for rect in self.free_rects]
+
+class MaxRectsAllocator(_FreeRectsAllocator):
+    '''Rectangular area allocator using the MaxRects algorithm.
+
+    The allocator keeps the list of maximal free rectangles and places each
+    request in the one it fits most tightly (best short side fit).  It packs
+    mixed sizes well regardless of the order they are allocated in, at the
+    cost of being slower than `Allocator`.  Freed areas are reused.
+    '''
+    def clear(self):
+        super(MaxRectsAllocator, self).clear()
+        # The allocated rectangles, to find the free space around freed ones.
+        self._used = set()
+
+    def resize(self, width, height):
+        old_width, old_height = self.width, self.height
+        super(MaxRectsAllocator, self).resize(width, height)
+
+        # Free rectangles touching the old edges extend into the new area.
+        rects = []
+        for x, y, w, h in self.free_rects:
+            if x + w == old_width:
+                w = width - x
+            if y + h == old_height:
+                h = height - y
+            rects.append((x, y, w, h))
+        if width > old_width:
+            rects.append((old_width, 0, width - old_width, height))
+        if height > old_height:
+            rects.append((0, old_height, width, height - old_height))
+        self.free_rects = _prune(rects)
+
+    def free(self, x, y, width, height):
+        if super(MaxRectsAllocator, self).free(x, y, width, height):
+            return True
+
+        freed = (x, y, width, height)
+        self._used.discard(freed)
+
+        # The free rectangles are all the largest ones in the free space, so
+        # the only new ones are those overlapping the freed area.  They can't
+        # reach past an allocated rectangle beside it that spans its whole
+        # side, so they are found by splitting that box around the
+        # rectangles allocated in it.
+        left, top = 0, 0
+        right, bottom = self.width, self.height
+        for ux, uy, uw, uh in self._used:
+            if uy <= y and uy + uh >= y + height:
+                if ux + uw <= x:
+                    left = max(left, ux + uw)
+                elif ux >= x + width:
+                    right = min(right, ux)
+            if ux <= x and ux + uw >= x + width:
+                if uy + uh <= y:
+                    top = max(top, uy + uh)
+                elif uy >= y + height:
+                    bottom = min(bottom, uy)
+        box = (left, top, right - left, bottom - top)
+
+        # Cutting around the nearest rectangles first keeps the pieces few.
+        def distance((ux, uy, uw, uh)):
+            return max(ux - x - width, x - ux - uw, uy - y - height,
+                y - uy - uh)
+        new = [box]
+        for used in sorted(
+                [used for used in self._used if _overlaps(used, box)],
+                key=distance):
+            new = _prune([rect for rect in _cut(new, used)
+                if _overlaps(rect, freed)])
+
+        # Old free rectangles may now lie within a new one.
+        self.free_rects = [rect for rect in self.free_rects
+            if not any(_contains(other, rect) for other in new)] + new
+        return False
+
+    def alloc(self, width, height):
+        best = None
+        best_short = best_long = None
+        for rect in self.free_rects:
+            if rect[2] >= width and rect[3] >= height:
+                leftover_x = rect[2] - width
+                leftover_y = rect[3] - height
+                short = min(leftover_x, leftover_y)
+                long = max(leftover_x, leftover_y)
+                if best is None or (short, long) < (best_short, best_long):
+                    best = rect
+                    best_short, best_long = short, long
+
+        if best is None:
+            raise AllocatorException('No more space in %r for box %dx%d' % (
+                    self, width, height))
+
+        placed = (best[0], best[1], width, height)
+        self._split(placed)
+        self._add_used(placed)
+        self._used.add(placed)
+        return placed[0], placed[1]
+
+    def _split(self, placed):
+        px, py, pw, ph = placed
+        kept = []
+        new = []
+        for rect in self.free_rects:
+            x, y, w, h = rect
+            if px >= x + w or x >= px + pw or py >= y + h or y >= py + ph:
+                kept.append(rect)
+                continue
+
+            if px > x:
+                new.append((x, y, px - x, h))
+            if px + pw < x + w:
+                new.append((px + pw, y, x + w - px - pw, h))
+            if py > y:
+                new.append((x, y, w, py - y))
+            if py + ph < y + h:
+                new.append((x, py + ph, w, y + h - py - ph))
+
+        # Only the new rectangles can be redundant: each lies within a free
+        # rectangle that was maximal, so none of the kept ones fit inside it.
+        pruned = []
+        for i, rect in enumerate(new):
+            x, y, w, h = rect
+            right, bottom = x + w, y + h
+            for other in kept:
+                if (other[0] <= x and other[1] <= y and
+                        other[0] + other[2] >= right and
+                        other[1] + other[3] >= bottom):
+                    break
+            else:
+                for j, other in enumerate(new):
+                    if j != i and _contains(other, rect) and (
+                            other != rect or j < i):
+                        break
+                else:
+                    pruned.append(rect)
+
+        self.free_rects = kept + pruned
+
+class SkylineAllocator(AbstractAllocator):
+    '''Rectangular area allocator using the Skyline algorithm.
+
+    The top edge of the allocated area is tracked as a list of horizontal
+    segments; each request is placed where its bottom edge ends up highest
+    (bottom-left rule, with the y axis pointing down).  It is nearly as fast
+    as `Allocator` and much less sensitive to allocation order, but space
+    left underneath the skyline is never reused, and freed areas are only
+    reclaimed once the allocator is empty.
+    '''
+    def clear(self):
+        super(SkylineAllocator, self).clear()
+        # List of [x, y, width] segments, ordered by x.
+        self.skyline = [[0, 0, self.width]]
+
+    def resize(self, width, height):
+        if width > self.width:
+            if self.skyline[-1][1] == 0:
+                self.skyline[-1][2] += width - self.width
+            else:
+                self.skyline.append([self.width, 0, width - self.width])
+        super(SkylineAllocator, self).resize(width, height)
+
+    def _fit(self, index, width, height):
+        x = self.skyline[index][0]
+        if x + width > self.width:
+            return None
+
+        y = 0
+        remaining = width
+        while remaining > 0:
+            y = max(y, self.skyline[index][1])
+            if y + height > self.height:
+                return None
+            remaining -= self.skyline[index][2]
+            index += 1
+        return y
+
+    def _fits(self, width, height):
+        for index in range(len(self.skyline)):
+            if self._fit(index, width, height) is not None:
+                return True
+        return False
+
+    def _get_max_free_size(self):
+        lowest = min(segment[1] for segment in self.skyline)
+        return self.width, self.height - lowest
+
+    def alloc(self, width, height):
+        best_index = None
+        best_bottom = best_x = None
+        for index in range(len(self.skyline)):
+            y = self._fit(index, width, height)
+            if y is None:
+                continue
+            x = self.skyline[index][0]
+            if best_index is None or (y + height, x) < (best_bottom, best_x):
+                best_index = index
+                best_bottom, best_x = y + height, x
+
+        if best_index is None:
+            raise AllocatorException('No more space in %r for box %dx%d' % (
+                    self, width, height))
+
+        x, y = best_x, best_bottom - height
+        self._add_segment(best_index, x, best_bottom, width)
+        self._add_used((x, y, width, height))
+        return x, y
+
+    def _add_segment(self, index, x, y, width):
+        skyline = self.skyline
+        skyline.insert(index, [x, y, width])
+
+        # Shrink or remove the segments now covered by the new one.
+        right = x + width
+        i = index + 1
+        while i < len(skyline) and skyline[i][0] < right:
+            segment = skyline[i]
+            segment_right = segment[0] + segment[2]
+            if segment_right <= right:
+                del skyline[i]
+            else:
+                segment[2] = segment_right - right
+                segment[0] = right
+                break
+
+        # Merge neighbouring segments of the same height.
+        i = 0
+        while i < len(skyline) - 1:
+            if skyline[i][1] == skyline[i + 1][1]:
+                skyline[i][2] += skyline[i + 1][2]
+                del skyline[i + 1]
+            else:
+                i += 1
+
+class GuillotineAllocator(_FreeRectsAllocator):
+    '''Rectangular area allocator using the Guillotine algorithm.
+
+    Free space is kept as a list of disjoint rectangles.  Each request is
+    placed in the free rectangle with the least area left over (best area
+    fit), and the remainder is split in two along the shorter leftover axis.
+    Freed areas are merged with neighbouring free rectangles and reused.
+    '''
+    def resize(self, width, height):
+        old_width, old_height = self.width, self.height
+        super(GuillotineAllocator, self).resize(width, height)
+
+        rects = list(self.free_rects)
+        if width > old_width:
+            rects.append((old_width, 0, width - old_width, height))
+        if height > old_height:
+            rects.append((0, old_height, old_width, height - old_height))
+        self.free_rects = _coalesce(rects)
+
+    def free(self, x, y, width, height):
+        if super(GuillotineAllocator, self).free(x, y, width, height):
+            return True
+
+        self.free_rects = _coalesce(self.free_rects + [(x, y, width, height)])
+        return False
+
+    def alloc(self, width, height):
+        best_index = None
+        best_area = None
+        for index, rect in enumerate(self.free_rects):
+            if rect[2] >= width and rect[3] >= height:
+                area = rect[2] * rect[3] - width * height
+                if best_index is None or area < best_area:
+                    best_index, best_area = index, area
+
+        if best_index is None:
+            raise AllocatorException('No more space in %r for box %dx%d' % (
+                    self, width, height))
+
+        x, y, w, h = self.free_rects.pop(best_index)
+        leftover_x = w - width
+        leftover_y = h - height
+        if leftover_x <= leftover_y:
+            right = (x + width, y, leftover_x, height)
+            bottom = (x, y + height, w, leftover_y)
+        else:
+            right = (x + width, y, leftover_x, h)
+            bottom = (x, y + height, width, leftover_y)
+
+        for rect in (right, bottom):
+            if rect[2] > 0 and rect[3] > 0:
+                self.free_rects.append(rect)
+
+        self._add_used((x, y, width, height))
+        return x, y
+
+#: Allocator classes by name, as accepted by the ``allocator`` argument of
+#: `SurfaceAtlas` and `SurfaceBin`.
+allocators = {
+    'strip': Allocator,
+    'maxrects': MaxRectsAllocator,
+    'skyline': SkylineAllocator,
+    'guillotine': GuillotineAllocator,
+}
+
+def _get_allocator_class(allocator):
+    if isinstance(allocator, basestring):
+        try:
+            return allocators[allocator]
+        except KeyError:
+            raise ValueError('Unknown allocator %r' % allocator)
+    return allocator
+
 class SurfaceAtlas(object):
     '''Collection of images within a texture.
     '''
-    def __init__(self, width=256, height=256, depth=32):
+    def __init__(self, width=256, height=256, depth=32, allocator=Allocator,
+            max_width=None, max_height=None):
         '''Create a texture atlas of the given size.
 
+        If `max_width` or `max_height` is larger than the initial size, the
+        atlas doubles in size whenever an image does not fit, until it
+        reaches that size.
+
         :Parameters:
             `width` : int
                 Width of the underlying texture.
             `height` : int
                 Height of the underlying texture.
+            `depth` : int
+                Depth of the underlying texture.
+            `allocator` : class or str
+                `AbstractAllocator` subclass used to pack images, or its name
+                in `allocators`.
+            `max_width` : int
+                Largest width the atlas may grow to, defaults to `width`.
+            `max_height` : int
+                Largest height the atlas may grow to, defaults to `height`.
 
         '''
         self.surface = pyglame.surface.Surface.create(
             width, height, depth, rectangle=True)
-        self.allocator = Allocator(width, height)
+        self.allocator = _get_allocator_class(allocator)(width, height)
+        self.max_width = max(max_width or width, width)
+        self.max_height = max(max_height or height, height)
+
+        # Map weak reference of each live region to its allocated rectangle.
+        self._regions = {}
+
+        # Weak reference to the `SurfaceBin` to notify when space is freed.
+        self._bin = None
 
-    def add(self, img):
+        # Map pixel key to region, for images added with ``dedup``.
+        self._duplicates = weakref.WeakValueDictionary()
+
+    def add(self, img, trim=False, dedup=False):
         '''Add an image to the atlas.
 
         This method will fail if the given image cannot be transferred
@@ -197,26 +785,219 @@ class SurfaceAtlas(object):
         `AllocatorException` will be raised if there is no room in the atlas
         for the image.
 
+        The space of the image belongs to the returned region: when the
+        region is garbage collected the space is freed, and may be cleared
+        or reused by later images.  Keep a reference to the region for as
+        long as its pixels are needed, for example until the atlas has been
+        saved.
+
         :Parameters:
             `img` : `AbstractSurface`
                 The image to add.
+            `trim` : bool
+                If True, fully transparent rows and columns around the image
+                are not stored.  The region returned is the size of the
+                visible part of the image, and its anchor is set to the
+                offset of that part, so it draws in the same place.
+            `dedup` : bool
+                If True and an identical image was added with `dedup`, and
+                its region is still alive, that region is returned instead
+                of storing the image again.
 
         :rtype: `SurfaceRegion`
         :return: The region of the atlas containing the newly added image.
         '''
+        offset_x = offset_y = 0
+        if trim:
+            img, offset_x, offset_y = _trim(img)
 
-        x, y = self.allocator.alloc(img.width, img.height)
+        if dedup:
+            key = _pixel_key(img, offset_x, offset_y)
+            region = self._duplicates.get(key)
+            if region is not None:
+                return region
+
+        x, y = self._alloc(img.width, img.height)
         draw.blit_into(self.surface, img, x, y)
         region = self.surface.get_region(x, y, img.width, img.height)
+        region.anchor_x += offset_x
+        region.anchor_y += offset_y
+        self._track(region, (x, y, img.width, img.height))
+
+        if dedup:
+            self._duplicates[key] = region
         return region
 
+    def can_fit(self, width, height):
+        '''Determine if an image of the given size could be added.
+
+        Growable atlases report True for any image no larger than their
+        maximum size until they have reached it, although growing may still
+        not make enough room.
+
+        :rtype: bool
+        '''
+        if self.allocator.can_fit(width, height):
+            return True
+        return ((self.allocator.width < self.max_width or
+                 self.allocator.height < self.max_height) and
+                width <= self.max_width and height <= self.max_height)
+
+    def _get_free_sizes(self):
+        # Sizes of image such that no image larger than all of them can be
+        # added, see `can_fit`.
+        if (self.allocator.width < self.max_width or
+                self.allocator.height < self.max_height):
+            return [(self.max_width, self.max_height)]
+        return self.allocator._get_free_sizes()
+
+    def _alloc(self, width, height):
+        while True:
+            try:
+                return self.allocator.alloc(width, height)
+            except AllocatorException:
+                if not self._grow():
+                    raise
+
+    def _grow(self):
+        # Double the smaller dimension that is allowed to grow.  Returns
+        # False if the atlas is already at its maximum size.
+        width, height = self.allocator.width, self.allocator.height
+        if width < self.max_width and (
+                width <= height or height >= self.max_height):
+            width = min(width * 2, self.max_width)
+        elif height < self.max_height:
+            height = min(height * 2, self.max_height)
+        else:
+            return False
+
+        old = self.surface.surface
+        new = pyglame.surface.Surface.create(
+            width, height, old.get_bitsize(), rectangle=True)
+        new.surface.blit(old, (0, 0))
+
+        # Swap the pixels of the existing Surface, as it is the parent of
+        # every region; only their cached subsurfaces need resetting.
+        self.surface._surface = new.surface
+        self.surface.width = new.width
+        self.surface.height = new.height
+        self.allocator.resize(width, height)
+
+        for ref, rect in self._regions.items():
+            region = ref()
+            if region is not None:
+                region._relocate(self.surface, rect[0], rect[1])
+        return True
+
+    def _track(self, region, rect):
+        # The callback only holds a weak reference to the atlas, so regions
+        # do not keep their atlas alive.
+        atlas_ref = weakref.ref(self)
+        def collected(ref):
+            atlas = atlas_ref()
+            if atlas is not None:
+                atlas._release(ref)
+        self._regions[weakref.ref(region, collected)] = rect
+
+    def _release(self, ref):
+        rect = self._regions.pop(ref, None)
+        if rect is not None:
+            self.surface.surface.fill((0, 0, 0, 0), rect)
+            empty = self.allocator.free(*rect)
+
+            # Only worth trying again if the space can be used.
+            if empty or self.allocator.reuses_space:
+                bin = self._bin and self._bin()
+                if bin is not None:
+                    bin._reopen(self)
+
+    def free(self, region):
+        '''Remove an image from the atlas.
+
+        Regions are removed automatically when they are garbage collected;
+        this method releases the space immediately.  The region must not be
+        used afterwards.
+
+        :Parameters:
+            `region` : `SurfaceRegion`
+                A region returned by `add`.
+
+        '''
+        ref = weakref.ref(region)
+        if ref not in self._regions:
+            raise ValueError('%r is not a region of %r' % (region, self))
+        self._release(ref)
+
+    def _adopt(self, region, source):
+        # Move `region` from the atlas `source` into this one, updating it in
+        # place.  Returns False if there is no room.
+        try:
+            x, y = self._alloc(region.width, region.height)
+        except AllocatorException:
+            return False
+
+        ref = weakref.ref(region)
+        self.surface.surface.blit(
+            source.surface.surface, (x, y), source._regions[ref])
+        source._release(ref)
+
+        region._relocate(self.surface, x, y)
+        self._track(region, (x, y, region.width, region.height))
+        return True
+
+    region_count = property(lambda self: len(self._regions),
+        doc='''Number of live regions in the atlas.  Read-only.
+
+        :type: int
+        ''')
+
+    def get_usage(self):
+        '''Get the fraction of the atlas area in use.
+
+        :rtype: float
+        '''
+        return self.allocator.get_usage()
+
+def _trim(img):
+    # Returns the part of `img` inside the bounding box of its visible
+    # pixels, and the offset of that box.
+    bounds = img.surface.get_bounding_rect()
+    if not bounds.width or not bounds.height or \
+            bounds.size == (img.width, img.height):
+        return img, 0, 0
+    return img.get_region(*bounds), bounds.x, bounds.y
+
+def _pixel_key(img, offset_x, offset_y):
+    pixels = pygame.image.tostring(img.surface, 'RGBA')
+    return (img.width, img.height, offset_x, offset_y,
+        hashlib.sha1(pixels).digest())
+
+def _free_sizes(atlas):
+    # The sizes of image `atlas` can fit, leaving out those no larger than
+    # another.
+    sizes = []
+    tallest = 0
+    for width, height in sorted(set(atlas._get_free_sizes()), reverse=True):
+        if height > tallest and width > 0:
+            sizes.append((width, height))
+            tallest = height
+    return sizes
+
+def _sorted_regions(atlases):
+    # ((ref, rect), atlas) for every region of `atlases`, tallest first.
+    return sorted(
+        ((item, atlas) for atlas in atlases for item in atlas._regions.items()),
+        key=lambda ((ref, rect), atlas): (-rect[3], -rect[2]))
+
 class SurfaceBin(object):
     '''Collection of texture atlases.
 
     `TextureBin` maintains a collection of texture atlases, and creates new
     ones as necessary to accommodate images added to the bin.
     '''
-    def __init__(self, texture_width=256, texture_height=256):
+    def __init__(self, texture_width=256, texture_height=256,
+            allocator=Allocator, max_texture_width=None,
+            max_texture_height=None):
         '''Create a texture bin for holding atlases of the given size.
 
         :Parameters:
@@ -224,38 +1005,278 @@ class SurfaceBin(object):
                 Width of texture atlases to create.
             `texture_height` : int
                 Height of texture atlases to create.
+            `allocator` : class or str
+                `AbstractAllocator` subclass used by the atlases, or its name
+                in `allocators`.
+            `max_texture_width` : int
+                Width atlases may grow to before a new one is created,
+                defaults to `texture_width`.
+            `max_texture_height` : int
+                Height atlases may grow to before a new one is created,
+                defaults to `texture_height`.
 
         '''
         self.atlases = []
         self.texture_width  = texture_width
         self.texture_height = texture_height
+        self.max_texture_width  = max_texture_width
+        self.max_texture_height = max_texture_height
+        self.allocator = _get_allocator_class(allocator)
+        self._compaction = None
+
+        # Atlases that may have room, mapped to the sizes of image they can
+        # fit (see `_free_sizes`).  An atlas is closed once it cannot fit the
+        # smallest image seen so far, and reopened when space in it is freed
+        # that its allocator can reuse.
+        self._open = {}
+        # Map size to the open atlases that can fit it, in the order they
+        # are tried, and the sizes in ascending order, so that atlases too
+        # small for an image are skipped without looking at them.
+        self._groups = {}
+        self._sizes = []
+        self._min_width = self._min_height = None
 
-    def add(self, img):
+        # Map pixel key to region, for images added with ``dedup``.
+        self._duplicates = weakref.WeakValueDictionary()
+
+    def add(self, img, trim=False, dedup=False):
         '''Add an image into this texture bin.
 
-        This method calls `TextureAtlas.add` for the first atlas that has room
-        for the image.
+        This method calls `SurfaceAtlas.add` for an atlas that has room for
+        the image, preferring the one with the smallest space it fits in.
+        Atlases are grouped by the sizes of image they can fit, so atlases
+        that are full, or too full for the image, are not considered and the
+        cost does not grow with the number of atlases.
 
         `AllocatorException` is raised if the image exceeds the dimensions of
-        ``texture_width`` and ``texture_height``.
+        ``max_texture_width`` and ``max_texture_height``.
 
         :Parameters:
             `img` : `AbstractSurface`
                 The image to add.
+            `trim` : bool
+                If True, only the visible part of the image is stored; see
+                `SurfaceAtlas.add`.
+            `dedup` : bool
+                If True, identical images added with `dedup` share a region,
+                across every atlas of the bin.
 
         :rtype: `SurfaceRegion`
         :return: The region of an atlas containing the newly added image.
         '''
-        for atlas in list(self.atlases):
-            try:
-                return atlas.add(img)
-            except AllocatorException:
-                # Remove atlases that are no longer useful (this is so their
-                # textures can later be freed if the images inside them get
-                # collected).
-                if img.width < 64 and img.height < 64:
-                    self.atlases.remove(atlas)
+        offset_x = offset_y = 0
+        if trim:
+            img, offset_x, offset_y = _trim(img)
+
+        if dedup:
+            key = _pixel_key(img, offset_x, offset_y)
+            region = self._duplicates.get(key)
+            if region is not None:
+                return region
+
+        region = self._add(img)
+        region.anchor_x += offset_x
+        region.anchor_y += offset_y
+
+        if dedup:
+            self._duplicates[key] = region
+        return region
+
+    def _add(self, img):
+        width, height = img.width, img.height
+        if self._min_width is None:
+            self._min_width, self._min_height = width, height
+        else:
+            self._min_width = min(self._min_width, width)
+            self._min_height = min(self._min_height, height)
+
+        # Try the atlases with the smallest space the image fits first, which
+        # leaves the larger spaces for larger images.
+        start = bisect.bisect_left(self._sizes, (width, height))
+        for size in sorted((size for size in self._sizes[start:]
+                if size[1] >= height), key=lambda (w, h): w * h):
+            # Adding may collect regions, which refiles their atlases.
+            for atlas in list(self._groups.get(size, ())):
+                if atlas.can_fit(width, height):
+                    try:
+                        region = atlas.add(img)
+                    except AllocatorException:
+                        continue
+                    self._update(atlas)
+                    return region
 
-        atlas = SurfaceAtlas(self.texture_width, self.texture_height)
+        atlas = self._create_atlas()
         self.atlases.append(atlas)
-        return atlas.add(img)
+        region = atlas.add(img)
+        self._update(atlas)
+        return region
+
+    def _create_atlas(self):
+        atlas = SurfaceAtlas(self.texture_width, self.texture_height,
+            allocator=self.allocator,
+            max_width=self.max_texture_width,
+            max_height=self.max_texture_height)
+        atlas._bin = weakref.ref(self)
+        self._update(atlas)
+        return atlas
+
+    def _update(self, atlas):
+        # File the atlas under the sizes of image it can fit now, or close
+        # it if it can't fit the smallest image.
+        self._close(atlas)
+        if (self._min_width is not None and
+                not atlas.can_fit(self._min_width, self._min_height)):
+            return
+        sizes = _free_sizes(atlas)
+        for size in sizes:
+            group = self._groups.get(size)
+            if group is None:
+                group = self._groups[size] = collections.OrderedDict()
+                bisect.insort(self._sizes, size)
+            group[atlas] = None
+        self._open[atlas] = sizes
+
+    def _close(self, atlas):
+        for size in self._open.pop(atlas, ()):
+            group = self._groups[size]
+            del group[atlas]
+            if not group:
+                del self._groups[size]
+                del self._sizes[bisect.bisect_left(self._sizes, size)]
+
+    def _reopen(self, atlas):
+        # Only atlases of the bin refer to it, see `trim`.
+        self._update(atlas)
+
+    def free(self, region):
+        '''Remove an image from the bin.
+
+        :Parameters:
+            `region` : `SurfaceRegion`
+                A region returned by `add`.
+
+        '''
+        for atlas in self.atlases:
+            if atlas.surface is region.parent:
+                atlas.free(region)
+                return
+        raise ValueError('%r is not a region of %r' % (region, self))
+
+    def compact(self, time_budget=None):
+        '''Repack the images of the bin into fewer atlases.
+
+        If the allocator reuses freed space, images are moved out of the
+        emptiest atlases into the fullest ones; otherwise every image is
+        moved into new atlases, tallest first, which briefly needs memory for
+        both.  Images are moved by updating their existing `SurfaceRegion` in
+        place, so references held by the application stay valid.  Atlases
+        left empty are dropped from the bin.
+
+        With a `time_budget` the work is spread over several calls; call this
+        method once per frame until it returns True::
+
+            def update(dt):
+                if compacting:
+                    compacting = not bin.compact(0.002)
+
+        :Parameters:
+            `time_budget` : float or None
+                Seconds to spend before returning, or None to finish in one
+                call.
+
+        :rtype: bool
+        :return: True once compaction has finished.
+        '''
+        if self._compaction is None:
+            self._compaction = self._iter_compaction()
+
+        if time_budget is not None:
+            deadline = clock._default_time_function() + time_budget
+
+        for step in self._compaction:
+            if (time_budget is not None and
+                    clock._default_time_function() >= deadline):
+                return False
+
+        self._compaction = None
+        self.trim()
+        return True
+
+    def _iter_compaction(self):
+        if self.allocator.reuses_space:
+            return self._iter_evacuate()
+        return self._iter_repack()
+
+    def _iter_evacuate(self):
+        # Emptiest atlases are evacuated first, into the fullest ones.
+        sources = sorted(self.atlases, key=lambda atlas: atlas.get_usage())
+        while len(sources) > 1:
+            source = sources.pop(0)
+            targets = sources[::-1]
+            free_area = sum(
+                target.allocator.width * target.allocator.height -
+                target.allocator.used_area for target in targets)
+            if source.allocator.used_area > free_area:
+                continue
+
+            for (ref, rect), atlas in _sorted_regions([source]):
+                region = ref()
+                if region is None or ref not in source._regions:
+                    continue
+
+                for target in targets:
+                    if target._adopt(region, source):
+                        self._update(target)
+                        break
+                else:
+                    # No room left for this image, so the source atlas
+                    # cannot be emptied.
+                    break
+
+                del region
+                yield
+
+    def _iter_repack(self):
+        # The allocator cannot reuse freed space, so every image is moved
+        # into new atlases, tallest first.
+        fresh = []
+        for (ref, rect), source in _sorted_regions(self.atlases):
+            region = ref()
+            if region is None or ref not in source._regions:
+                continue
+
+            for target in fresh:
+                if target._adopt(region, source):
+                    break
+            else:
+                target = self._create_atlas()
+                # New images should go into the new atlases too.
+                self.atlases.insert(len(fresh), target)
+                fresh.append(target)
+                target._adopt(region, source)
+            self._update(target)
+
+            del region
+            yield
+
+    def trim(self):
+        '''Drop atlases that no longer contain any images.'''
+        for atlas in self.atlases:
+            if not atlas.region_count:
+                atlas._bin = None
+                self._close(atlas)
+        self.atlases = [atlas for atlas in self.atlases if atlas.region_count]
+
+    def get_occupancy(self):
+        '''Describe how full each atlas of the bin is.
+
+        This method is useful for debugging and profiling only.
+
+        :rtype: list of (int, float, float)
+        :return: For each atlas, the number of live regions, the fraction of
+            area in use and the allocator's fragmentation estimate.
+        '''
+        return [(atlas.region_count,
+                 atlas.allocator.get_usage(),
+                 atlas.allocator.get_fragmentation())
+            for atlas in self.atlases]
@@ -0,0 +1,279 @@
+# ----------------------------------------------------------------------------
+#
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+'''Compact binary manifests for baked texture atlases.
+
+A manifest lists, for each image baked by ``tools/make_resource_atlas.py``,
+the atlas image holding it and where.  The JSON manifest has to be parsed in
+full before the first lookup; this binary format is memory-mapped instead,
+and an entry is only decoded when its name is looked up::
+
+    from pyglame.surface import manifest
+
+    with open('sprites.atlas.bin', 'rb') as file:
+        manifest.write(file, atlas_names, images)
+
+    sprites = manifest.AtlasManifest.open(open('sprites.atlas.bin', 'rb'))
+    atlas_name, x, y, width, height = sprites.get('player.png')[:5]
+
+The file starts with a header, followed by the table of atlas names, one
+fixed-size record per image sorted by name, the table of extended records
+holding the trim and rotation of the images that have one, sorted by record
+number, an open-addressing hash table of record numbers keyed by the CRC-32
+of the image name, and the string table holding every name.  Hashes are not
+stored; they are computed again from the name being looked up.  All
+integers are little-endian.
+
+:since: pyglame 0.0.1
+'''
+
+__docformat__ = 'restructuredtext'
+__version__ = '$Id$'
+
+import mmap
+import struct
+
+from pyglame import _hashtable
+
+#: Identifies binary atlas manifests.
+MAGIC = 'PGAM'
+
+#: Version of the format written by `write`.
+VERSION = 2
+
+# magic, version, reserved, atlas count, image count, extended record count,
+# hash table size, string table size.
+_header = struct.Struct('<4sHHIIIII')
+
+# Offset and length of the name in the string table.
+_atlas = struct.Struct('<II')
+
+# Name offset, name length, atlas, x, y, width, height.  The top bit of the
+# name length is set if the image has an extended record.
+_record = struct.Struct('<IHHHHHH')
+
+# Record number, offset x, offset y, full width, full height, flags.
+_extended = struct.Struct('<IHHHHH')
+
+_EXTENDED = 0x8000
+
+# Extended record flags.
+_ROTATED = 1
+
+class ManifestException(Exception):
+    '''The file is not a manifest this module can read.'''
+    pass
+
+def write(file, atlases, images):
+    '''Write a binary manifest.
+
+    :Parameters:
+        `file` : file-like object
+            File to write to, opened in binary mode.
+        `atlases` : list of str
+            Names of the atlas images.
+        `images` : dict
+            Map of image name to a list of the atlas image name, x, y,
+            width and height of the image in the atlas; optionally followed
+            by the offset x, offset y, full width, full height and rotation
+            flag of images that were trimmed or rotated, as in the JSON
+            manifest.
+
+    '''
+    strings = []
+    string_size = [0]
+    def add_string(name):
+        name = _hashtable.encode(name)
+        strings.append(name)
+        string_size[0] += len(name)
+        return string_size[0] - len(name), len(name)
+
+    atlas_ids = {}
+    atlas_table = []
+    for i, atlas_name in enumerate(atlases):
+        atlas_ids[atlas_name] = i
+        atlas_table.append(_atlas.pack(*add_string(atlas_name)))
+
+    records = []
+    extended = []
+    names = []
+    images = sorted((_hashtable.encode(name), entry)
+        for name, entry in images.items())
+    for i, (name, entry) in enumerate(images):
+        offset, length = add_string(name)
+        if length >= _EXTENDED:
+            raise ValueError('Image name %r is too long' % name)
+        if len(entry) > 5:
+            length |= _EXTENDED
+            flags = entry[9] and _ROTATED or 0
+            extended.append(_extended.pack(i, *(tuple(entry[5:9]) + (flags,))))
+        records.append(_record.pack(
+            offset, length, atlas_ids[entry[0]], *entry[1:5]))
+        names.append(name)
+    table_size, table = _hashtable.write_table(names)
+
+    file.write(_header.pack(MAGIC, VERSION, 0,
+        len(atlas_table), len(records), len(extended), table_size,
+        string_size[0]))
+    file.write(''.join(atlas_table))
+    file.write(''.join(records))
+    file.write(''.join(extended))
+    file.write(table)
+    file.write(''.join(strings))
+
+class AtlasManifest(object):
+    '''A binary manifest, read on demand.
+
+    Entries are returned in the same form as the lists of the JSON manifest:
+    ``(atlas_name, x, y, width, height)``, followed by ``offset_x,
+    offset_y, full_width, full_height, rotated`` for images that were
+    trimmed or rotated.
+    '''
+    def __init__(self, data):
+        '''Read a manifest from a buffer.
+
+        :Parameters:
+            `data` : str, buffer or ``mmap.mmap``
+                Contents of the manifest file.
+
+        '''
+        if len(data) < _header.size:
+            raise ManifestException('Manifest is truncated')
+        (magic, version, reserved, atlas_count, self._image_count,
+            self._extended_count, self._table_size,
+            string_size) = _header.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ManifestException('Not a binary atlas manifest')
+        if version != VERSION:
+            raise ManifestException(
+                'Unsupported manifest version %d' % version)
+
+        self._data = data
+        self._records = _header.size + atlas_count * _atlas.size
+        self._extended = self._records + self._image_count * _record.size
+        self._table = self._extended + self._extended_count * _extended.size
+        self._strings = self._table + self._table_size * _hashtable.SLOT_SIZE
+        if len(data) < self._strings + string_size:
+            raise ManifestException('Manifest is truncated')
+
+        self.atlases = []
+        for i in range(atlas_count):
+            offset, length = _atlas.unpack_from(
+                data, _header.size + i * _atlas.size)
+            self.atlases.append(self._get_string(offset, length))
+
+    @classmethod
+    def open(cls, file):
+        '''Read a manifest from a file, memory-mapping it if possible.
+
+        :Parameters:
+            `file` : file-like object
+                File opened in binary mode.
+
+        :rtype: `AtlasManifest`
+        '''
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, EnvironmentError, ValueError):
+            data = file.read()
+        return cls(data)
+
+    def _get_string(self, offset, length):
+        start = self._strings + offset
+        return self._data[start:start + length]
+
+    def _get_record(self, index):
+        return _record.unpack_from(
+            self._data, self._records + index * _record.size)
+
+    def _get_name(self, record):
+        return self._get_string(record[0], record[1] & ~_EXTENDED)
+
+    def _find(self, name):
+        # Returns the record number and unpacked record of `name`, or None.
+        index = _hashtable.find(self._data, self._table, self._table_size,
+            name, lambda i: self._get_name(self._get_record(i)))
+        if index is None:
+            return None
+        return index, self._get_record(index)
+
+    def _find_extended(self, index):
+        # Binary search of the extended records, which are sorted by record
+        # number.
+        low = 0
+        high = self._extended_count
+        while low < high:
+            middle = (low + high) // 2
+            extended = _extended.unpack_from(
+                self._data, self._extended + middle * _extended.size)
+            if extended[0] < index:
+                low = middle + 1
+            elif extended[0] > index:
+                high = middle
+            else:
+                return extended
+        raise ManifestException('Missing extended record %d' % index)
+
+    def get(self, name, default=None):
+        '''Look up the entry of an image.
+
+        :Parameters:
+            `name` : str
+                Name of the image.
+            `default` : object
+                Value returned if the image is not in the manifest.
+
+        :rtype: tuple
+        '''
+        found = self._find(name)
+        if found is None:
+            return default
+
+        index, record = found
+        entry = (self.atlases[record[2]],) + record[3:7]
+        if record[1] & _EXTENDED:
+            extended = self._find_extended(index)
+            entry += extended[1:5] + (int(bool(extended[5] & _ROTATED)),)
+        return entry
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def __len__(self):
+        return self._image_count
+
+    def __iter__(self):
+        for i in range(self._image_count):
+            yield self._get_name(self._get_record(i))
@@ -0,0 +1,216 @@
+# ----------------------------------------------------------------------------
+#
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+'''Bulk pixel operations on images.
+
+Every operation works in-place on the pixel arrays returned by
+`AbstractSurface.get_pixels` and `AbstractSurface.get_pixels_alpha`, so it
+applies equally to whole surfaces and to regions of an atlas.  Each function
+accepts either a single image or a sequence of images::
+
+    from pyglame.surface import ops
+
+    ops.tint(sprites, (255, 128, 128))
+    ops.fade(sprites, 0.5)
+
+This module requires NumPy.
+
+:since: pyglame 0.0.1
+'''
+
+__docformat__ = 'restructuredtext'
+__version__ = '$Id$'
+
+import numpy
+
+from pyglame import surface
+
+#: Luminance weights used by `grayscale` (ITU-R BT.601).
+GRAYSCALE_WEIGHTS = (299, 587, 114)
+
+def _images(images):
+    if isinstance(images, surface.AbstractSurface):
+        return (images,)
+    return images
+
+def _scale(pixels, factor):
+    # factor is an integer in 0..255, or an array broadcastable to pixels.
+    temp = pixels.astype(numpy.uint16)
+    temp *= factor
+    temp += 127
+    temp //= 255
+    pixels[...] = temp
+
+def tint(images, color):
+    '''Multiply the colour of images by `color`.
+
+    :Parameters:
+        `images` : `AbstractSurface` or sequence of `AbstractSurface`
+            Images to modify.
+        `color` : (int, int, int) or (int, int, int, int)
+            Colour to multiply by; if an alpha value is given, the alpha
+            channel is multiplied as well.
+
+    '''
+    rgb = numpy.array(color[:3], dtype=numpy.uint16)
+    for image in _images(images):
+        _scale(image.get_pixels(), rgb)
+        if len(color) > 3:
+            _scale(image.get_pixels_alpha(), color[3])
+
+def fade(images, opacity):
+    '''Multiply the alpha channel of images by `opacity`.
+
+    :Parameters:
+        `images` : `AbstractSurface` or sequence of `AbstractSurface`
+            Images to modify.
+        `opacity` : float
+            Opacity between 0.0 (invisible) and 1.0 (unchanged).
+
+    '''
+    factor = int(round(min(max(opacity, 0.0), 1.0) * 255))
+    for image in _images(images):
+        _scale(image.get_pixels_alpha(), factor)
+
+def premultiply(images):
+    '''Multiply the colour of images by their own alpha channel.
+
+    :Parameters:
+        `images` : `AbstractSurface` or sequence of `AbstractSurface`
+            Images to modify.
+
+    '''
+    for image in _images(images):
+        alpha = image.get_pixels_alpha()
+        _scale(image.get_pixels(), alpha[..., numpy.newaxis])
+
+def grayscale(images):
+    '''Replace the colour of images with its luminance.
+
+    :Parameters:
+        `images` : `AbstractSurface` or sequence of `AbstractSurface`
+            Images to modify.
+
+    '''
+    weights = numpy.array(GRAYSCALE_WEIGHTS, dtype=numpy.uint32)
+    for image in _images(images):
+        pixels = image.get_pixels()
+        luma = numpy.dot(pixels, weights) // 1000
+        pixels[...] = luma[..., numpy.newaxis]
+
+def apply_lut(images, table):
+    '''Remap the colour channels of images through a lookup table.
+
+    :Parameters:
+        `images` : `AbstractSurface` or sequence of `AbstractSurface`
+            Images to modify.
+        `table` : array_like
+            Either 256 values used for every channel, or an array of shape
+            ``(256, 3)`` with a separate column for red, green and blue.
+
+    '''
+    table = numpy.asarray(table, dtype=numpy.uint8)
+    if table.shape not in ((256,), (256, 3)):
+        raise ValueError('Lookup table must have shape (256,) or (256, 3).')
+
+    for image in _images(images):
+        pixels = image.get_pixels()
+        if table.ndim == 1:
+            pixels[...] = table[pixels]
+        else:
+            for channel in range(3):
+                pixels[..., channel] = table[pixels[..., channel], channel]
+
+def palette_swap(images, palette):
+    '''Replace exact colours in images.
+
+    :Parameters:
+        `images` : `AbstractSurface` or sequence of `AbstractSurface`
+            Images to modify.
+        `palette` : dict
+            Mapping of ``(r, g, b)`` source colours to ``(r, g, b)``
+            replacement colours.  Colours not in the mapping are left alone.
+
+    '''
+    if not palette:
+        return
+
+    keys = numpy.array(
+        [(r << 16) | (g << 8) | b for r, g, b in palette.keys()],
+        dtype=numpy.uint32)
+    values = numpy.array(palette.values(), dtype=numpy.uint8)
+    order = numpy.argsort(keys)
+    keys, values = keys[order], values[order]
+
+    for image in _images(images):
+        pixels = image.get_pixels()
+        packed = pixels.astype(numpy.uint32)
+        packed = (packed[..., 0] << 16) | (packed[..., 1] << 8) | packed[..., 2]
+
+        index = numpy.searchsorted(keys, packed)
+        index[index == len(keys)] = 0
+        matched = keys[index] == packed
+        pixels[matched] = values[index[matched]]
+
+def threshold(image, level=128, channel='alpha'):
+    '''Build a mask of the pixels of an image above a given level.
+
+    Unlike the other operations the image is not modified; a new array is
+    returned.
+
+    :Parameters:
+        `image` : `AbstractSurface`
+            Image to read.
+        `level` : int
+            Pixels with a value greater than or equal to `level` are set in
+            the mask.
+        `channel` : str
+            One of ``'alpha'``, ``'red'``, ``'green'``, ``'blue'`` or
+            ``'luminance'``.
+
+    :rtype: `numpy.ndarray`
+    :return: A boolean array of shape ``(width, height)``.
+    '''
+    if channel == 'alpha':
+        values = image.get_pixels_alpha()
+    elif channel == 'luminance':
+        weights = numpy.array(GRAYSCALE_WEIGHTS, dtype=numpy.uint32)
+        values = numpy.dot(image.get_pixels(), weights) // 1000
+    elif channel in ('red', 'green', 'blue'):
+        values = image.get_pixels()[..., ('red', 'green', 'blue').index(channel)]
+    else:
+        raise ValueError('Unknown channel %r' % channel)
+
+    return values >= level
@@ -0,0 +1,300 @@
+# ----------------------------------------------------------------------------
+#
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+'''Draw large tile maps using cached chunks.
+
+A `TileMap` is a grid of indices into a list of tile images.  The map is
+rendered in square chunks of tiles; each chunk is drawn onto its own surface
+once and then reused every frame, so drawing the visible part of the map
+only takes a blit per visible chunk::
+
+    from pyglame import resource, tilemap
+
+    tiles = tilemap.load_tileset(['grass.png', 'water.png', 'sand.png'])
+    level = tilemap.TileMap(1000, 1000, 32, 32, tiles)
+    level.set_tile(10, 4, 1)
+
+    def on_draw():
+        level.draw(window.surface, camera_x, camera_y)
+
+Changing a tile only re-renders the chunk containing it.  Chunks far from
+the camera are dropped from the cache when it grows larger than
+``max_chunks``.
+
+:since: pyglame 0.0.1
+'''
+
+__docformat__ = 'restructuredtext'
+__version__ = '$Id$'
+
+import array
+
+import pyglame
+from pyglame import surface
+
+#: Tile index of empty cells.
+EMPTY = -1
+
+def load_tileset(names, loader=None):
+    '''Load a list of tile images with a resource loader.
+
+    Images small enough to be packed are returned as regions of the loader's
+    atlases.
+
+    :Parameters:
+        `names` : list of str
+            Resource names of the tile images, in tile index order.
+        `loader` : `pyglame.resource.Loader`
+            Loader to use, defaults to the default `pyglame.resource` loader.
+
+    :rtype: list of `AbstractSurface`
+    '''
+    if loader is None:
+        loader = pyglame.resource
+    return [loader.image(name) for name in names]
+
+class TileMap(object):
+    '''A grid of tiles drawn through cached chunk surfaces.
+
+    :Ivariables:
+        `width` : int
+            Width of the map, in tiles.
+        `height` : int
+            Height of the map, in tiles.
+        `tile_width` : int
+            Width of a tile, in pixels.
+        `tile_height` : int
+            Height of a tile, in pixels.
+        `tiles` : list of `AbstractSurface`
+            Tile images, indexed by the values stored in the map.
+        `chunk_size` : int
+            Width and height of a chunk, in tiles.
+        `max_chunks` : int
+            Number of chunk surfaces to keep cached.  Chunks that are
+            visible are never dropped, even when over this limit.
+        `chunks_rendered` : int
+            Number of times a chunk has been rendered.  Useful for profiling.
+
+    '''
+    def __init__(self, width, height, tile_width, tile_height, tiles,
+            chunk_size=16, max_chunks=64, pool=None):
+        '''Create an empty tile map.
+
+        :Parameters:
+            `width` : int
+                Width of the map, in tiles.
+            `height` : int
+                Height of the map, in tiles.
+            `tile_width` : int
+                Width of a tile, in pixels.
+            `tile_height` : int
+                Height of a tile, in pixels.
+            `tiles` : list of `AbstractSurface`
+                Tile images, indexed by the values stored in the map.
+            `chunk_size` : int
+                Width and height of a chunk, in tiles.
+            `max_chunks` : int
+                Number of chunk surfaces to keep cached.
+            `pool` : `pyglame.surface.SurfacePool`
+                Pool to take chunk surfaces from, defaults to a pool owned by
+                this map.
+
+        '''
+        self.width = width
+        self.height = height
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.tiles = list(tiles)
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.chunks_rendered = 0
+
+        if pool is None:
+            pool = surface.SurfacePool()
+        self._pool = pool
+
+        self._cells = array.array('i', [EMPTY]) * (width * height)
+
+        # Map (chunk x, chunk y) to chunk image.
+        self._chunks = {}
+        self._dirty = set()
+
+    def get_tile(self, x, y):
+        '''Get the tile index at a cell.
+
+        :rtype: int
+        '''
+        return self._cells[y * self.width + x]
+
+    def set_tile(self, x, y, index):
+        '''Set the tile index at a cell.
+
+        :Parameters:
+            `x` : int
+                Column of the cell.
+            `y` : int
+                Row of the cell.
+            `index` : int
+                Index into `tiles`, or `EMPTY`.
+
+        '''
+        offset = y * self.width + x
+        if self._cells[offset] != index:
+            self._cells[offset] = index
+            self._dirty.add((x // self.chunk_size, y // self.chunk_size))
+
+    def set_tiles(self, cells):
+        '''Replace every cell of the map.
+
+        :Parameters:
+            `cells` : sequence of int
+                ``width * height`` tile indices, in rows from the top.
+
+        '''
+        if len(cells) != self.width * self.height:
+            raise ValueError('Expected %d cells, got %d' % (
+                self.width * self.height, len(cells)))
+        self._cells = array.array('i', cells)
+        self.invalidate()
+
+    def invalidate(self):
+        '''Mark every cached chunk as needing to be rendered again.
+
+        Call this after changing the images in `tiles`.
+        '''
+        self._dirty.update(self._chunks)
+
+    def _render_chunk(self, chunk_x, chunk_y, image):
+        if image is None:
+            image = self._pool.acquire(
+                self.chunk_size * self.tile_width,
+                self.chunk_size * self.tile_height)
+        else:
+            image.surface.fill((0, 0, 0, 0))
+
+        tiles = self.tiles
+        cells = self._cells
+        left = chunk_x * self.chunk_size
+        top = chunk_y * self.chunk_size
+        right = min(left + self.chunk_size, self.width)
+        bottom = min(top + self.chunk_size, self.height)
+
+        sources = [tile.get_blit_source() for tile in tiles]
+        blits = []
+        for y in range(top, bottom):
+            row = y * self.width
+            dest_y = (y - top) * self.tile_height
+            for x in range(left, right):
+                index = cells[row + x]
+                if index != EMPTY:
+                    psurf, area = sources[index]
+                    blits.append(
+                        (psurf, ((x - left) * self.tile_width, dest_y), area))
+
+        target = image.surface
+        if hasattr(target, 'blits'):
+            target.blits(blits, doreturn=0)
+        else:
+            for psurf, dest, area in blits:
+                target.blit(psurf, dest, area)
+
+        self.chunks_rendered += 1
+        return image
+
+    def _evict(self, center_x, center_y, visible):
+        def distance(key):
+            return max(abs(key[0] - center_x), abs(key[1] - center_y))
+
+        candidates = sorted(
+            (key for key in self._chunks if key not in visible),
+            key=distance, reverse=True)
+        for key in candidates[:len(self._chunks) - self.max_chunks]:
+            self._pool.release(self._chunks.pop(key))
+            self._dirty.discard(key)
+
+    def draw(self, dest, view_x, view_y):
+        '''Draw the map onto a surface.
+
+        :Parameters:
+            `dest` : `AbstractSurface`
+                Surface to draw onto; the whole surface is used as the
+                viewport.
+            `view_x` : int
+                Map X coordinate, in pixels, of the left edge of `dest`.
+            `view_y` : int
+                Map Y coordinate, in pixels, of the top edge of `dest`.
+
+        '''
+        chunk_width = self.chunk_size * self.tile_width
+        chunk_height = self.chunk_size * self.tile_height
+        columns = (self.width + self.chunk_size - 1) // self.chunk_size
+        rows = (self.height + self.chunk_size - 1) // self.chunk_size
+
+        first_x = max(view_x // chunk_width, 0)
+        first_y = max(view_y // chunk_height, 0)
+        last_x = min((view_x + dest.width - 1) // chunk_width, columns - 1)
+        last_y = min((view_y + dest.height - 1) // chunk_height, rows - 1)
+
+        psurf_dest, area = dest.get_blit_source()
+        if area is None:
+            area = psurf_dest.get_rect()
+
+        visible = set()
+        blits = []
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                key = chunk_x, chunk_y
+                visible.add(key)
+
+                image = self._chunks.get(key)
+                if image is None or key in self._dirty:
+                    image = self._chunks[key] = \
+                        self._render_chunk(chunk_x, chunk_y, image)
+                    self._dirty.discard(key)
+
+                psurf, source_area = image.get_blit_source()
+                blits.append((psurf, (
+                    area.x + chunk_x * chunk_width - view_x,
+                    area.y + chunk_y * chunk_height - view_y), source_area))
+
+        old_clip = psurf_dest.get_clip()
+        psurf_dest.set_clip(area)
+        for psurf, position, source_area in blits:
+            psurf_dest.blit(psurf, position, source_area)
+        psurf_dest.set_clip(old_clip)
+
+        if len(self._chunks) > self.max_chunks:
+            self._evict(
+                (first_x + last_x) / 2.0, (first_y + last_y) / 2.0, visible)
@@ -0,0 +1,142 @@
+# ----------------------------------------------------------------------------
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+import os
+import random
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from pyglame import surface
+from pyglame.surface import atlas
+
+def ui_icons(rng):
+    sizes = [(16, 16), (24, 24), (32, 32), (48, 48), (64, 64),
+             (96, 24), (128, 32), (20, 40)]
+    return [rng.choice(sizes) for i in range(1500)]
+
+def glyphs(rng):
+    return [(rng.randint(4, 20), rng.randint(12, 24)) for i in range(4000)]
+
+def sprites(rng):
+    return [(rng.randint(8, 96), rng.randint(8, 96)) for i in range(800)]
+
+def tiles(rng):
+    return [(32, 32)] * 2000
+
+sprite_sets = [
+    ('ui icons', ui_icons),
+    ('glyphs', glyphs),
+    ('sprites', sprites),
+    ('tiles', tiles),
+]
+
+def pack(allocator_class, boxes, width, height):
+    '''Pack boxes into as many allocators as needed, first fit.'''
+    bins = []
+    for w, h in boxes:
+        for allocator in bins:
+            try:
+                allocator.alloc(w, h)
+                break
+            except atlas.AllocatorException:
+                pass
+        else:
+            allocator = allocator_class(width, height)
+            allocator.alloc(w, h)
+            bins.append(allocator)
+    return bins
+
+def naive_bin_add(atlases, img, width, height):
+    # SurfaceBin.add before atlases were indexed: try every atlas in turn.
+    for item in atlases:
+        try:
+            return item.add(img)
+        except atlas.AllocatorException:
+            pass
+    item = atlas.SurfaceAtlas(width, height)
+    atlases.append(item)
+    return item.add(img)
+
+def bench_insertion(label, sizes, size=64, report=1000):
+    print "\nInserting {} {} images into {}x{} atlases".format(
+        len(sizes), label, size, size)
+    print "{:>7} {:>7} {:>14} {:>14}".format(
+        'images', 'atlases', 'naive (us)', 'SurfaceBin (us)')
+    images = dict((box, surface.Surface.create(*box)) for box in set(sizes))
+    atlases = []
+    bin = atlas.SurfaceBin(size, size)
+    regions = []
+    for start in range(0, len(sizes), report):
+        boxes = sizes[start:start + report]
+        begin = time.time()
+        for box in boxes:
+            regions.append(naive_bin_add(atlases, images[box], size, size))
+        naive = (time.time() - begin) / len(boxes)
+
+        begin = time.time()
+        for box in boxes:
+            regions.append(bin.add(images[box]))
+        indexed = (time.time() - begin) / len(boxes)
+
+        print "{:>7} {:>7} {:>14.1f} {:>14.1f}".format(
+            start + len(boxes), len(bin.atlases), naive * 1e6, indexed * 1e6)
+
+def main(width=512, height=512, seed=0):
+    print "{:<10} {:<8} {:<11} {:>7} {:>10} {:>10}".format(
+        'set', 'order', 'allocator', 'atlases', 'efficiency', 'time (ms)')
+    for set_name, make in sprite_sets:
+        boxes = make(random.Random(seed))
+        area = sum(w * h for w, h in boxes)
+        orders = [
+            ('random', boxes),
+            ('height', sorted(boxes, key=lambda (w, h): (-h, -w))),
+        ]
+        for order_name, ordered in orders:
+            for name in ('strip', 'skyline', 'guillotine', 'maxrects'):
+                start = time.time()
+                bins = pack(atlas.allocators[name], ordered, width, height)
+                seconds = time.time() - start
+                efficiency = area / float(len(bins) * width * height)
+                print "{:<10} {:<8} {:<11} {:>7} {:>9.1f}% {:>10.1f}".format(
+                    set_name, order_name, name, len(bins),
+                    efficiency * 100, seconds * 1000)
+
+if __name__ == '__main__':
+    main()
+    bench_insertion('16x16', [(16, 16)] * 8000)
+    # Mixed sizes leave most atlases with room for small images only.
+    rng = random.Random(0)
+    bench_insertion('mixed', [(rng.randint(4, 32), rng.randint(4, 32))
+        for i in range(8000)])
@@ -0,0 +1,92 @@
+# ----------------------------------------------------------------------------
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+import json
+import os
+import random
+import tempfile
+import timeit
+
+from pyglame.surface import manifest
+
+def make_images(count, atlas_count):
+    atlases = ['atlas_{:03d}.png'.format(i) for i in range(atlas_count)]
+    images = {}
+    for i in range(count):
+        images['sprites/frame_{:06d}.png'.format(i)] = [
+            atlases[i % atlas_count], i % 1000, i // 1000 % 1000, 32, 32]
+    return atlases, images
+
+def bench(label, func, number):
+    seconds = timeit.timeit(func, number=number) / number
+    print "{:<28} {:10.3f} ms".format(label, seconds * 1000)
+
+def main(count=100000, lookups=1000):
+    atlases, images = make_images(count, 64)
+    folder = tempfile.mkdtemp()
+    json_name = os.path.join(folder, 'sprites.atlas.json')
+    binary_name = os.path.join(folder, 'sprites.atlas.bin')
+
+    with open(json_name, 'w') as file_handle:
+        json.dump({'Version': '0.1', 'Images': images, 'Atlases': atlases},
+            file_handle)
+    with open(binary_name, 'wb') as file_handle:
+        manifest.write(file_handle, atlases, images)
+    print "{} entries: JSON {} KB, binary {} KB".format(count,
+        os.path.getsize(json_name) // 1024,
+        os.path.getsize(binary_name) // 1024)
+
+    names = random.sample(sorted(images), lookups)
+
+    def json_lookup():
+        with open(json_name) as file_handle:
+            index = json.load(file_handle)['Images']
+        for name in names:
+            index[name]
+
+    def binary_lookup():
+        with open(binary_name, 'rb') as file_handle:
+            index = manifest.AtlasManifest.open(file_handle)
+        for name in names:
+            index.get(name)
+
+    bench('JSON load + {} lookups'.format(lookups), json_lookup, 3)
+    bench('binary open + {} lookups'.format(lookups), binary_lookup, 3)
+
+    os.remove(json_name)
+    os.remove(binary_name)
+    os.rmdir(folder)
+
+if __name__ == '__main__':
+    main()
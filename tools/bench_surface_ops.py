@@ -0,0 +1,107 @@
+# ----------------------------------------------------------------------------
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+import os
+import timeit
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from pyglame import surface
+from pyglame.surface import ops
+
+def make_sprites(count, width, height):
+    atlas = surface.atlas.SurfaceAtlas(512, 512)
+    sprites = []
+    for i in range(count):
+        image = surface.Surface.create(width, height)
+        image.surface.fill((i * 7 % 256, 128, 200, 255))
+        sprites.append(atlas.add(image))
+    return sprites
+
+def naive_tint(sprites, color):
+    for sprite in sprites:
+        pixels = sprite.surface
+        for x in range(sprite.width):
+            for y in range(sprite.height):
+                r, g, b, a = pixels.get_at((x, y))
+                pixels.set_at((x, y), (
+                    r * color[0] // 255,
+                    g * color[1] // 255,
+                    b * color[2] // 255, a))
+
+def naive_fade(sprites, opacity):
+    for sprite in sprites:
+        pixels = sprite.surface
+        for x in range(sprite.width):
+            for y in range(sprite.height):
+                r, g, b, a = pixels.get_at((x, y))
+                pixels.set_at((x, y), (r, g, b, int(a * opacity)))
+
+def fill_tint(sprites, color):
+    # The closest pygame gets without per-pixel access.
+    for sprite in sprites:
+        sprite.surface.fill(color, special_flags=pygame.BLEND_RGB_MULT)
+
+def bench(label, func, number):
+    seconds = timeit.timeit(func, number=number) / number
+    print "{:<28} {:10.3f} ms".format(label, seconds * 1000)
+
+def main(count=48, size=32, number=5):
+    sprites = make_sprites(count, size, size)
+    print "{} sprites of {} x {}".format(count, size, size)
+
+    bench('naive tint (get/set_at)',
+        lambda: naive_tint(sprites, (255, 128, 64)), 1)
+    bench('fill BLEND_RGB_MULT',
+        lambda: fill_tint(sprites, (255, 128, 64)), number)
+    bench('ops.tint',
+        lambda: ops.tint(sprites, (255, 128, 64)), number)
+
+    bench('naive fade (get/set_at)',
+        lambda: naive_fade(sprites, 0.5), 1)
+    bench('ops.fade',
+        lambda: ops.fade(sprites, 0.5), number)
+
+    bench('ops.premultiply', lambda: ops.premultiply(sprites), number)
+    bench('ops.grayscale', lambda: ops.grayscale(sprites), number)
+    bench('ops.apply_lut',
+        lambda: ops.apply_lut(sprites, range(255, -1, -1)), number)
+    bench('ops.palette_swap',
+        lambda: ops.palette_swap(sprites, {(0, 128, 200): (1, 2, 3)}),
+        number)
+
+if __name__ == '__main__':
+    main()
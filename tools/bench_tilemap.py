@@ -0,0 +1,106 @@
+# ----------------------------------------------------------------------------
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+import os
+import random
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from pyglame import surface
+from pyglame import tilemap
+
+def make_tiles(count, width, height):
+    bin = surface.atlas.SurfaceBin(512, 512)
+    tiles = []
+    for i in range(count):
+        image = surface.Surface.create(width, height)
+        image.surface.fill((i * 37 % 256, i * 91 % 256, 128, 255))
+        tiles.append(bin.add(image))
+    return tiles
+
+def naive_draw(level, dest, view_x, view_y):
+    # Blit every visible tile individually.
+    tw, th = level.tile_width, level.tile_height
+    first_x, first_y = view_x // tw, view_y // th
+    last_x = min((view_x + dest.width - 1) // tw, level.width - 1)
+    last_y = min((view_y + dest.height - 1) // th, level.height - 1)
+    psurf_dest = dest.surface
+    for y in range(first_y, last_y + 1):
+        for x in range(first_x, last_x + 1):
+            index = level.get_tile(x, y)
+            if index != tilemap.EMPTY:
+                psurf, area = level.tiles[index].get_blit_source()
+                psurf_dest.blit(psurf, (x * tw - view_x, y * th - view_y), area)
+
+def scroll(draw, level, dest, frames, speed):
+    start = time.time()
+    x = y = 0
+    for frame in range(frames):
+        draw(level, dest, x, y)
+        x += speed
+        y += speed // 2
+    return (time.time() - start) / frames
+
+def main(size=1000, tile=16, frames=300, speed=7):
+    random.seed(0)
+    tiles = make_tiles(64, tile, tile)
+
+    start = time.time()
+    level = tilemap.TileMap(size, size, tile, tile, tiles)
+    level.set_tiles([random.randrange(len(tiles)) for i in range(size * size)])
+    print "{0} x {0} map built in {1:.2f} s".format(size, time.time() - start)
+
+    dest = surface.Surface.create(640, 480)
+
+    seconds = scroll(naive_draw, level, dest, frames, speed)
+    print "{:<24} {:8.3f} ms/frame".format('per-tile blits', seconds * 1000)
+
+    seconds = scroll(
+        lambda level, dest, x, y: level.draw(dest, x, y),
+        level, dest, frames, speed)
+    print "{:<24} {:8.3f} ms/frame ({} chunks rendered, {} cached)".format(
+        'chunked', seconds * 1000, level.chunks_rendered, len(level._chunks))
+
+    for i in range(100):
+        level.set_tile(random.randrange(20), random.randrange(15), 0)
+    rendered = level.chunks_rendered
+    level.draw(dest, 0, 0)
+    print "after 100 edits: {} chunks re-rendered".format(
+        level.chunks_rendered - rendered)
+
+if __name__ == '__main__':
+    main()
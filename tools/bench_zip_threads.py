@@ -0,0 +1,93 @@
+# ----------------------------------------------------------------------------
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from multiprocessing.pool import ThreadPool
+
+from pyglame import resource
+
+def make_archive(filename, count, size):
+    # Compressible but not trivially so, like image data.
+    chunk = ''.join(chr(i % 97) for i in range(size // 4))
+    chunk += os.urandom(size // 4)
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zip:
+        for i in range(count):
+            zip.writestr('member_{:04d}.bin'.format(i), chunk * 2)
+    return ['member_{:04d}.bin'.format(i) for i in range(count)]
+
+def bench(label, read, names, threads, number=3):
+    pool = ThreadPool(threads)
+    best = None
+    for i in range(number):
+        start = time.time()
+        pool.map(read, names, chunksize=1)
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+    pool.close()
+    pool.join()
+    print "{:<24} {:2d} threads {:10.3f} ms".format(
+        label, threads, best * 1000)
+
+def main(count=200, size=256 * 1024):
+    folder = tempfile.mkdtemp()
+    filename = os.path.join(folder, 'bench.zip')
+    names = make_archive(filename, count, size)
+    print "{} members of {} KB, archive {} KB".format(
+        count, size // 1024, os.path.getsize(filename) // 1024)
+
+    # A single ZipFile shared between the threads, as ZIPLocation used to.
+    shared = zipfile.ZipFile(filename)
+    lock = threading.Lock()
+    def shared_read(name):
+        with lock:
+            return shared.read(name)
+
+    location = resource.ZIPLocation(filename, '')
+    def location_read(name):
+        return location.buffer(name)
+
+    for threads in (1, 2, 4, 8):
+        bench('locked ZipFile', shared_read, names, threads)
+        bench('ZIPLocation.buffer', location_read, names, threads)
+
+    shared.close()
+    os.remove(filename)
+    os.rmdir(folder)
+
+if __name__ == '__main__':
+    main()
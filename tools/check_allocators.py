@@ -0,0 +1,94 @@
+# ----------------------------------------------------------------------------
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+import random
+
+from pyglame.surface import atlas
+
+def check(label, condition):
+    print "{:<48} {}".format(label, 'ok' if condition else 'FAILED')
+    if not condition:
+        raise SystemExit(1)
+
+def rebuilt_free_rects(width, height, used):
+    # The free rectangles of an allocator that only ever allocated `used`.
+    allocator = atlas.MaxRectsAllocator(width, height)
+    for rect in used:
+        allocator._split(rect)
+    return set(allocator.free_rects)
+
+def check_l_shape():
+    # Free three quarters of a full atlas, leaving an L of free space around
+    # the last quarter, then allocate both arms of the L.
+    allocator = atlas.MaxRectsAllocator(64, 64)
+    quarters = [allocator.alloc(32, 32) for i in range(4)]
+    for x, y in quarters:
+        if (x, y) != (32, 32):
+            allocator.free(x, y, 32, 32)
+    check('L-shaped free space gives whole arms',
+        allocator.can_fit(64, 32) and allocator.can_fit(32, 64))
+    allocator.alloc(64, 32)
+    check('merged area can be allocated', allocator.get_usage() == 0.75)
+
+def check_random(runs=100, steps=60, seed=0):
+    # Free rectangles after any mix of alloc and free should be the same as
+    # after allocating what is left from scratch.
+    rng = random.Random(seed)
+    for run in range(runs):
+        size = rng.choice([32, 64, 128])
+        allocator = atlas.MaxRectsAllocator(size, size)
+        used = []
+        for step in range(steps):
+            if used and rng.random() < 0.4:
+                allocator.free(*used.pop(rng.randrange(len(used))))
+            else:
+                width = rng.randint(1, size // 3)
+                height = rng.randint(1, size // 3)
+                try:
+                    x, y = allocator.alloc(width, height)
+                except atlas.AllocatorException:
+                    continue
+                used.append((x, y, width, height))
+            if used and set(allocator.free_rects) != \
+                    rebuilt_free_rects(size, size, used):
+                check('random frees keep the largest free rectangles',
+                    False)
+    check('random frees keep the largest free rectangles', True)
+
+def main():
+    check_l_shape()
+    check_random()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# ----------------------------------------------------------------------------
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+import gc
+import json
+import os
+import shutil
+import tempfile
+import weakref
+
+import pygame
+
+from pyglame import resource
+
+def check(label, condition):
+    print "{:<48} {}".format(label, 'ok' if condition else 'FAILED')
+    if not condition:
+        raise SystemExit(1)
+
+def write_image(root, name, size):
+    image = pygame.Surface(size, pygame.SRCALPHA, 32)
+    image.fill((255, 0, 0, 255))
+    pygame.image.save(image, os.path.join(root, name))
+
+def check_unload(use_image):
+    # Load a bundle, optionally fetching its images through `image` too,
+    # and check that its atlas is freed once it is unloaded.
+    root = tempfile.mkdtemp()
+    names = ['a.png', 'b.png', 'c.png']
+    for i, name in enumerate(names):
+        write_image(root, name, (16 + i * 8, 16))
+    with open(os.path.join(root, 'level.bundle.json'), 'w') as file_handle:
+        json.dump({'images': names}, file_handle)
+
+    loader = resource.Loader([root])
+    bundle = loader.load_bundle('level')
+    atlas = weakref.ref(bundle.images['a.png'].abs_parent)
+    if use_image:
+        same = [loader.image(name) is bundle.images[name] for name in names]
+        check('image returns the bundle images', all(same))
+
+    loader.unload_bundle('level')
+    del bundle
+    gc.collect()
+    label = 'atlas is freed after unload'
+    if use_image:
+        label = 'atlas is freed after unload and image'
+    check(label, atlas() is None)
+    check('no bytes are left in the image cache', loader._recent_bytes == 0)
+    shutil.rmtree(root)
+
+def main():
+    check_unload(False)
+    check_unload(True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+# ----------------------------------------------------------------------------
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+import BaseHTTPServer
+import hashlib
+import os
+import shutil
+import SimpleHTTPServer
+import socket
+import SocketServer
+import sys
+import tempfile
+import threading
+import urllib2
+
+from pyglame import resource
+
+class Handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    # Keep connections open between requests, like a real server.
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        SimpleHTTPServer.SimpleHTTPRequestHandler.setup(self)
+        self.server.connections.append(self.connection)
+
+    # SimpleHTTPServer doesn't answer conditional requests or send an ETag,
+    # so files get one made from their contents, and requests whose
+    # If-None-Match (or, without one, If-Modified-Since) matches get a 304.
+    def do_GET(self):
+        server = self.server
+        self.etag = None
+        if server.status is not None:
+            self.send_error(server.status)
+            return
+        if self.path == '/moved':
+            self.send_response(302)
+            self.send_header('Location', '/a.txt')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            with open(path, 'rb') as file_handle:
+                self.etag = '"{}"'.format(
+                    hashlib.sha1(file_handle.read()).hexdigest())
+            match = self.headers.getheader('if-none-match')
+            since = self.headers.getheader('if-modified-since')
+            if match is not None:
+                not_modified = match == self.etag
+            else:
+                not_modified = since == self.date_time_string(
+                    os.path.getmtime(path))
+            if not_modified:
+                self.send_response(304)
+                self.end_headers()
+                return
+        SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
+
+    def end_headers(self):
+        if self.etag is not None:
+            self.send_header('ETag', self.etag)
+        SimpleHTTPServer.SimpleHTTPRequestHandler.end_headers(self)
+
+    def copyfile(self, source, outputfile):
+        data = source.read()
+        self.server.body_bytes += len(data)
+        outputfile.write(data)
+
+    def translate_path(self, path):
+        path = SimpleHTTPServer.SimpleHTTPRequestHandler.translate_path(
+            self, path)
+        return os.path.join(self.server.root,
+            os.path.relpath(path, os.getcwd()))
+
+    def log_request(self, code='-', size='-'):
+        self.server.codes.append(code)
+
+    def log_message(self, format, *args):
+        pass
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    # Each kept-alive connection holds a thread until it is closed.
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Connections reset by stop_server are expected.
+        if not isinstance(sys.exc_info()[1], socket.error):
+            BaseHTTPServer.HTTPServer.handle_error(
+                self, request, client_address)
+
+def start_server(root):
+    server = Server(('127.0.0.1', 0), Handler)
+    server.root = root
+    server.status = None
+    server.codes = []
+    server.connections = []
+    server.body_bytes = 0
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+def stop_server(server):
+    # Also close the kept-alive connections, so that the server is really
+    # offline.
+    server.shutdown()
+    server.server_close()
+    for connection in server.connections:
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+def write_file(root, name, data, mtime):
+    path = os.path.join(root, name)
+    with open(path, 'wb') as file_handle:
+        file_handle.write(data)
+    os.utime(path, (mtime, mtime))
+
+def check(label, condition):
+    print "{:<40} {}".format(label, 'ok' if condition else 'FAILED')
+    if not condition:
+        raise SystemExit(1)
+
+def main():
+    # Serve a temporary folder, and check that files are downloaded (200)
+    # over one kept-alive connection, revalidated by ETag (304), followed
+    # through redirects, prefetched, taken from the cache when the server
+    # fails or is offline, and that the cache is trimmed to its size limit.
+    root = tempfile.mkdtemp()
+    cache_dir = tempfile.mkdtemp()
+    write_file(root, 'a.txt', 'first', 1000000000)
+    for i in range(4):
+        write_file(root, 'big{}.bin'.format(i), os.urandom(4000), 1000000000)
+
+    server = start_server(root)
+    base = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    location = resource.CachedURLLocation(base, cache_dir,
+        max_cache_size=10000, timeout=5)
+
+    data = location.open('a.txt').read()
+    check('200 downloads the file', data == 'first' and
+        server.codes[-1] == 200)
+
+    body_bytes = server.body_bytes
+    data = location.open('a.txt').read()
+    check('304 uses the cached copy', data == 'first' and
+        server.codes[-1] == 304)
+    check('304 sends no body', server.body_bytes == body_bytes)
+
+    # A new modification time with the same contents only matches the ETag.
+    write_file(root, 'a.txt', 'first', 1000000050)
+    data = location.open('a.txt').read()
+    check('If-None-Match is sent and honoured', data == 'first' and
+        server.codes[-1] == 304 and server.body_bytes == body_bytes)
+
+    write_file(root, 'a.txt', 'second', 1000000100)
+    data = location.open('a.txt').read()
+    check('200 replaces a changed file', data == 'second' and
+        server.codes[-1] == 200)
+
+    data = location.open('moved').read()
+    check('redirects are followed', data == 'second' and
+        server.codes[-2:] == [302, 200])
+    check('requests share one connection', len(server.connections) == 1)
+
+    try:
+        location.open('missing.txt')
+    except urllib2.HTTPError, e:
+        check('404 raises HTTPError', e.code == 404)
+    else:
+        check('404 raises HTTPError', False)
+
+    server.status = 503
+    data = location.open('a.txt').read()
+    check('5xx uses the cached copy', data == 'second' and
+        server.codes[-1] == 503)
+    server.status = None
+
+    errors = location.prefetch(['big0.bin', 'big1.bin'])
+    check('prefetch downloads the files', not errors and
+        server.codes[-2:] == [200, 200])
+    body_bytes = server.body_bytes
+    data = location.open('big0.bin').read()
+    check('open after prefetch uses the cache', len(data) == 4000 and
+        server.codes[-1] == 304 and server.body_bytes == body_bytes)
+
+    for i in range(2, 4):
+        location.open('big{}.bin'.format(i))
+    names = os.listdir(cache_dir)
+    size = sum(os.path.getsize(os.path.join(cache_dir, name))
+        for name in names)
+    check('cache is trimmed to max_cache_size', size <= 10000)
+    check('least recently used files are removed', len(names) < 5)
+
+    stop_server(server)
+    data = location.open('big3.bin').read()
+    check('offline uses the cached copy', len(data) == 4000)
+    try:
+        location.open('big1.bin')
+    except EnvironmentError:
+        check('offline without a cached copy raises', True)
+    else:
+        check('offline without a cached copy raises', False)
+
+    shutil.rmtree(root)
+    shutil.rmtree(cache_dir)
+
+if __name__ == '__main__':
+    main()
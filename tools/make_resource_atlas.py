@@ -33,14 +33,29 @@
 # POSSIBILITY OF SUCH DAMAGE.
 # ----------------------------------------------------------------------------
 
+import argparse
+import collections
+import hashlib
+import itertools
 import json
+import multiprocessing
 import os
 import re
+import StringIO
+import time
 
 import pygame
 import pyglame
 
+from pyglame import resource
 from pyglame import surface
+from pyglame.surface import manifest
+
+#: Version of the ``.cache.json`` files written by `bake_atlas`.
+CACHE_VERSION = 2
+
+#: File extensions picked up when baking whole folders.
+image_extensions = ('.png', '.bmp', '.gif', '.jpg', '.jpeg', '.tga')
 
 def default_name_fixer(file_name, duplicate=False):
     new_name = file_name.rsplit('/',1)[-1]
@@ -49,76 +64,499 @@ def default_name_fixer(file_name, duplicate=False):
         new_name = "{}_{:03d}.{}".format(temp[0], duplicate, temp[1])
     return new_name
 
-def atlases_add(atlases, image, width, height):
+def rotate_image(image):
+    # Turn an image 90 degrees clockwise.
+    rotated = pygame.transform.rotate(image.surface, -90)
+    return surface.Surface(rotated.get_width(), rotated.get_height(), rotated)
+
+def unrotate_image(image):
+    rotated = pygame.transform.rotate(image.surface, 90)
+    return surface.Surface(rotated.get_width(), rotated.get_height(), rotated)
+
+def atlases_add(atlases, image, width, height,
+        allocator=surface.atlas.Allocator, rotate=False):
+    # Returns the index of the atlas, the region and whether the image was
+    # rotated to fit.  The caller must keep the region alive until the atlas
+    # is saved, or its space is freed (see `SurfaceAtlas.add`).
+    rotated = None
     for i, atlas in enumerate(atlases):
         try:
-            return i, atlas.add(image)
+            return i, atlas.add(image), False
         except surface.atlas.AllocatorException:
             pass
+        if rotate:
+            if rotated is None:
+                rotated = rotate_image(image)
+            try:
+                return i, atlas.add(rotated), True
+            except surface.atlas.AllocatorException:
+                pass
     else:
-        atlas = surface.atlas.SurfaceAtlas(width, height)
+        atlas = surface.atlas.SurfaceAtlas(width, height, allocator=allocator)
         atlases.append(atlas)
-        return len(atlases)-1, atlas.add(image)
+        if rotate and (image.width > width or image.height > height):
+            return len(atlases)-1, atlas.add(rotate_image(image)), True
+        return len(atlases)-1, atlas.add(image), False
+
+def decode_image(job):
+    # Runs in the worker processes.  pygame surfaces can't be pickled, so the
+    # pixels are sent back as an RGBA string, along with the bounding box of
+    # the pixels that aren't fully transparent.
+    file_name, data = job
+    image = pygame.image.load(StringIO.StringIO(data), file_name)
+    bounds = image.get_bounding_rect()
+    return (file_name, image.get_size(),
+        pygame.image.tostring(image, 'RGBA'),
+        (bounds.x, bounds.y, bounds.width, bounds.height))
+
+def decode_images(file_info, workers=None, chunksize=16):
+    '''Decode images in a pool of `workers` processes.
+
+    Files are read in this process, so any `pyglame.resource.Location` can be
+    used.  ``(file_name, image, bounds)`` tuples are yielded in the order of
+    `file_info` as soon as they are decoded.  If `workers` is 0 every image
+    is decoded in this process.
+    '''
+    jobs = ((file_name, location.open(file_name).read())
+        for location, file_name in file_info)
+
+    pool = None
+    if workers != 0:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(decode_image, jobs, chunksize)
+    else:
+        results = (decode_image(job) for job in jobs)
+
+    try:
+        for file_name, size, pixels, bounds in results:
+            image = pygame.image.fromstring(pixels, size, 'RGBA')
+            yield file_name, surface.Surface(size[0], size[1], image), bounds
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+def hash_file(location, file_name):
+    return hashlib.sha1(location.open(file_name).read()).hexdigest()
+
+def load_cache(out_folder, atlas_name, settings):
+    '''Load the packing results of the previous `bake_atlas` run.
+
+    Returns None if there are none, or if they were made with different
+    settings or their atlas images are missing.
+    '''
+    cache_file_name = os.path.join(
+        out_folder, "{}.cache.json".format(atlas_name))
+    try:
+        with open(cache_file_name) as file_handle:
+            cache = json.load(file_handle)
+    except (IOError, ValueError):
+        return None
+
+    if cache.get('Version') != CACHE_VERSION or \
+            cache.get('Settings') != settings:
+        return None
+    for i in range(len(cache['Atlases'])):
+        atlas_image_name = "{}_{:03d}.png".format(atlas_name, i)
+        if not os.path.exists(os.path.join(out_folder, atlas_image_name)):
+            return None
+    return cache
+
+def write_file(file_name, write, mode='wb'):
+    '''Call `write` with a temporary file next to `file_name`, then move it
+    into place, so that a running game that has the old file open or
+    memory-mapped never sees half of the new one.
+    '''
+    temp_file_name = file_name + '.tmp'
+    with open(temp_file_name, mode) as file_handle:
+        write(file_handle)
+    # os.rename replaces the target atomically, except on Windows, where it
+    # fails if the target exists.
+    if os.name == 'nt' and os.path.exists(file_name):
+        os.remove(file_name)
+    os.rename(temp_file_name, file_name)
 
+def restore_atlas(path, rects, width, height, allocator):
+    # Rebuild an atlas from its saved image, replaying the allocations in
+    # their original order to get the allocator back to the same state.
+    # Returns None if the allocator doesn't place the images where it did.
+    atlas = surface.atlas.SurfaceAtlas(width, height, allocator=allocator)
+    for x, y, w, h in rects:
+        try:
+            if atlas.allocator.alloc(w, h) != (x, y):
+                return None
+        except surface.atlas.AllocatorException:
+            return None
+    atlas.surface.surface.blit(pygame.image.load(path), (0, 0))
+    return atlas
 
 def bake_atlas(
         out_folder, atlas_name,
         file_info,
         width, height,
-        name_fixer=default_name_fixer):
+        name_fixer=default_name_fixer,
+        allocator=surface.atlas.Allocator,
+        workers=None,
+        verbose=False,
+        incremental=True,
+        trim=False,
+        rotate=False,
+        dedup=False,
+        binary=False):
+    '''Pack images into atlases and write a manifest for them.
 
-    atlases = []
-    images  = {}
-    new_names = {}
+    When `incremental` is set, the packing results are kept in
+    ``<atlas_name>.cache.json`` alongside the manifest.  The next run only
+    decodes inputs whose content hash changed.  Images are stored in slots,
+    keyed by their pixels with `dedup` and by their name and hash
+    otherwise, so slots whose image is unchanged stay where they are.  The
+    slots of images that were removed or changed are taken over by new
+    images of the same size (or, with `rotate`, of the turned size), which
+    are drawn in their place.  An atlas with a freed slot that can't be
+    taken over is repacked, and the remaining new images are added to
+    atlases with room.
+
+    With `trim`, fully transparent borders are cut off the images.  With
+    `rotate`, images that don't fit an atlas are tried turned 90 degrees
+    clockwise.  With `dedup`, images with identical (trimmed) pixels share
+    one area of the atlas.  Manifest entries of trimmed or rotated images
+    have five extra fields: the offset of the stored area in the original
+    image, the original width and height, and 1 if the image was rotated.
 
+    With `binary`, the manifest is written as ``<atlas_name>.atlas.bin`` in
+    the format of `pyglame.surface.manifest` instead of as JSON.
+    '''
+    allocator_name = surface.atlas._get_allocator_class(allocator).__name__
+    settings = {
+        'width': width, 'height': height, 'allocator': allocator_name,
+        'trim': trim, 'rotate': rotate, 'dedup': dedup}
+    cache = None
+    if incremental:
+        cache = load_cache(out_folder, atlas_name, settings)
+    if cache is None:
+        cache = {'Images': {}, 'Slots': {}, 'Atlases': []}
+    old_entries = cache['Images']
+    old_slots = cache['Slots']
+
+    timings = []
+
+    start = time.time()
+    sources = collections.OrderedDict()
     for file_location, old_file_name in file_info:
-        image = surface.load(old_file_name, file_location.open(old_file_name))
         file_name = name_fixer(old_file_name, False)
 
         i = 1
-        while file_name in images:
+        while file_name in sources:
             file_name = name_fixer(old_file_name, i)
             i += 1
 
-        if image.width > (width/2) or image.height > (height/2):
-            new_names[old_file_name] = None
+        sources[file_name] = (file_location, old_file_name,
+            hash_file(file_location, old_file_name))
+
+    entries = {}
+    changed = set()
+    for file_name, (file_location, old_file_name, digest) in \
+            sources.items():
+        entry = old_entries.get(file_name)
+        if entry and entry['source'] == old_file_name and \
+                entry['hash'] == digest:
+            entries[file_name] = entry
+        else:
+            changed.add(file_name)
+    timings.append(('hash', time.time() - start))
+
+    # Images are stored in "slots", keyed by content when deduplicating and
+    # by name otherwise.  Only slots that aren't in the atlases yet need
+    # placing.
+    start = time.time()
+    pending = {}
+    total_area = border_area = 0
+    decode_order = [file_name for file_name in sources if file_name in changed]
+    decoded = decode_images(
+        [sources[file_name][:2] for file_name in decode_order], workers)
+    for file_name, (old_file_name, image, bounds) in itertools.izip(
+            decode_order, decoded):
+        entry = entries[file_name] = {
+            'source': old_file_name,
+            'hash': sources[file_name][2],
+            'slot': None,
+            'offset': [0, 0],
+            'size': [image.width, image.height]}
+
+        total_area += image.width * image.height
+        border_area += image.width * image.height - bounds[2] * bounds[3]
+        if trim and bounds[2] and bounds[3]:
+            entry['offset'] = list(bounds[:2])
+            trimmed = surface.Surface.create(bounds[2], bounds[3])
+            trimmed.surface.blit(image.surface, (0, 0), bounds)
+            image = trimmed
+
+        if (image.width > (width/2) or image.height > (height/2)) and \
+                not (rotate and image.height <= (width/2) and
+                     image.width <= (height/2)):
             print "Skipping {} ({} x {}), image too big.".format(
                 file_name, image.width, image.height)
             continue
 
-        new_names[old_file_name] = file_name
+        if dedup:
+            pixels = pygame.image.tostring(image.surface, 'RGBA')
+            key = "{}x{}:{}".format(image.width, image.height,
+                hashlib.sha1(pixels).hexdigest())
+        else:
+            key = "{}:{}".format(file_name, entry['hash'])
+        entry['slot'] = key
+        if key not in old_slots:
+            pending[key] = image
+    timings.append(('decode', time.time() - start))
 
-        images[file_name] = image
+    start = time.time()
+    live = set(entry['slot'] for entry in entries.values())
 
-    output = {'Version': '0.1', 'Images': {}, "Atlases": []}
-    for file_name, image in sorted(
-            images.items(),
+    # New images by size, to take over the slots of removed images.
+    by_size = collections.defaultdict(list)
+    for key, image in sorted(pending.items()):
+        by_size[image.width, image.height].append(key)
+
+    def take_over(slot):
+        x, y, w, h = slot['rect']
+        if slot['rotated']:
+            w, h = h, w
+        if by_size[w, h]:
+            return by_size[w, h].pop(), slot['rotated']
+        if rotate and by_size[h, w]:
+            return by_size[h, w].pop(), not slot['rotated']
+        return None
+
+    slots = {}
+    atlases = []
+    members = []
+    modified = set()
+    for i, old_members in enumerate(cache['Atlases']):
+        path = os.path.join(out_folder, "{}_{:03d}.png".format(atlas_name, i))
+
+        # Slots of removed images are handed to new images of the same size,
+        # which are drawn in their place.  If that isn't possible for all of
+        # them, the atlas is repacked.
+        atlas = restore_atlas(
+            path, [old_slots[key]['rect'] for key in old_members],
+            width, height, allocator)
+        takeovers = {}
+        if atlas is not None:
+            for key in old_members:
+                if key not in live:
+                    match = take_over(old_slots[key])
+                    if match is None:
+                        atlas = None
+                        break
+                    takeovers[key] = match
+        if atlas is None:
+            for new_key, rotated in takeovers.values():
+                image = pending[new_key]
+                by_size[image.width, image.height].append(new_key)
+            takeovers = {}
+
+        if atlas is None:
+            # Repack: move the images still in use back into the queue.
+            old_image = pygame.image.load(path)
+            for key in old_members:
+                if key in live:
+                    x, y, w, h = old_slots[key]['rect']
+                    image = surface.Surface.create(w, h)
+                    image.surface.blit(old_image, (0, 0), (x, y, w, h))
+                    if old_slots[key]['rotated']:
+                        image = unrotate_image(image)
+                    pending[key] = image
+            atlas = surface.atlas.SurfaceAtlas(
+                width, height, allocator=allocator)
+            old_members = []
+            modified.add(i)
+
+        new_members = []
+        for key in old_members:
+            if key in takeovers:
+                old_key = key
+                key, rotated = takeovers[old_key]
+                image = pending.pop(key)
+                if rotated:
+                    image = rotate_image(image)
+                x, y, w, h = old_slots[old_key]['rect']
+                atlas.surface.surface.fill((0, 0, 0, 0), (x, y, w, h))
+                atlas.surface.surface.blit(image.surface, (x, y))
+                slots[key] = {
+                    'atlas': i, 'rect': [x, y, w, h], 'rotated': rotated}
+                modified.add(i)
+            else:
+                slots[key] = old_slots[key]
+            new_members.append(key)
+
+        atlases.append(atlas)
+        members.append(new_members)
+
+    # Regions give their space back to the atlas when they are collected, so
+    # they have to be kept until the atlases are saved.
+    regions = []
+    for key, image in sorted(
+            pending.items(),
             key=lambda (x, y): (-y.height, -y.width, x)):
-        atlas_id, image = atlases_add(atlases, image, width, height)
+        atlas_id, image, rotated = atlases_add(
+            atlases, image, width, height, allocator, rotate)
+        regions.append(image)
+        if atlas_id == len(members):
+            members.append([])
+        members[atlas_id].append(key)
+        modified.add(atlas_id)
 
+        slots[key] = {
+            'atlas': atlas_id,
+            'rect': [image.x, image.y, image.width, image.height],
+            'rotated': rotated}
+    timings.append(('pack', time.time() - start))
+
+    start = time.time()
+    output = {'Version': '0.1', 'Images': {}, "Atlases": []}
+    new_names = {}
+    for file_name, (file_location, old_file_name, digest) in \
+            sources.items():
+        entry = entries[file_name]
+        if entry['slot'] is None:
+            new_names[old_file_name] = None
+            continue
+        new_names[old_file_name] = file_name
+
+        slot = slots[entry['slot']]
+        x, y, w, h = slot['rect']
         output['Images'][file_name] = [
-            "{}_{:03d}.png".format(atlas_name, atlas_id),
-            image.x, image.y, image.width, image.height]
+            "{}_{:03d}.png".format(atlas_name, slot['atlas']), x, y, w, h]
+        if slot['rotated']:
+            w, h = h, w
+        if slot['rotated'] or entry['offset'] != [0, 0] or \
+                entry['size'] != [w, h]:
+            output['Images'][file_name] += \
+                entry['offset'] + entry['size'] + [int(slot['rotated'])]
 
     packed = 0
     for i, atlas in enumerate(atlases):
         atlas_image_name = "{}_{:03d}.png".format(atlas_name, i)
-        pygame.image.save(atlas.surface.surface, os.path.join(out_folder, atlas_image_name))
+        if i in modified:
+            pygame.image.save(atlas.surface.surface, os.path.join(out_folder, atlas_image_name))
         output['Atlases'].append(atlas_image_name)
         packed += atlas.allocator.get_fragmentation()
 
-    ## Nicer json formatting :D
-    def fix_arrays(x):
-        temp = json.dumps(json.loads(x.group(1)))
-        temp = re.sub(r', (\d+)', lambda y: ", {:4d}".format(int(y.group(1))), temp)
-        return temp
+    json_file_name = os.path.join(
+        out_folder, "{}.atlas.json".format(atlas_name))
+    binary_file_name = os.path.join(
+        out_folder, "{}.atlas.bin".format(atlas_name))
+    if binary:
+        atlas_file_name, stale_file_name = binary_file_name, json_file_name
+        write_file(atlas_file_name, lambda file_handle: manifest.write(
+            file_handle, output['Atlases'], output['Images']))
+    else:
+        atlas_file_name, stale_file_name = json_file_name, binary_file_name
+
+        ## Nicer json formatting :D
+        def fix_arrays(x):
+            temp = json.dumps(json.loads(x.group(1)))
+            temp = re.sub(r', (\d+)', lambda y: ", {:4d}".format(int(y.group(1))), temp)
+            return temp
+
+        temp = json.dumps(output, sort_keys=True, indent=4)
+        temp = re.sub(r'(\[(?:\s*(?:(?:".*?"|\d+),?))+\s*?\])', fix_arrays, temp)
 
-    temp = json.dumps(output, sort_keys=True, indent=4)
-    temp = re.sub(r'(\[(?:\s*(?:(?:".*?"|\d+),?))+\s*?\])', fix_arrays, temp)
+        write_file(atlas_file_name,
+            lambda file_handle: file_handle.write(temp), 'w')
 
-    atlas_file_name = os.path.join(out_folder, "{}.json".format(atlas_name))
-    with open(atlas_file_name, 'w') as file_handle:
-        file_handle.write(temp)
+    # The loader would read both manifests if the format was switched.
+    if os.path.exists(stale_file_name):
+        os.remove(stale_file_name)
+
+    cache = {
+        'Version': CACHE_VERSION,
+        'Settings': settings,
+        'Images': entries,
+        'Slots': slots,
+        'Atlases': members}
+    write_file(os.path.join(out_folder, "{}.cache.json".format(atlas_name)),
+        lambda file_handle: json.dump(cache, file_handle, sort_keys=True),
+        'w')
+    timings.append(('save', time.time() - start))
+
+    if verbose:
+        print "{} images in {} atlases of {} x {}".format(
+            len(output['Images']), len(atlases), width, height)
+        print "{} images decoded, {} atlases written".format(
+            len(changed), len(modified))
+        if dedup:
+            print "{} duplicate images".format(
+                len(output['Images']) - len(slots))
+        if total_area:
+            print "{:.1%} of the decoded area is transparent border".format(
+                float(border_area) / total_area)
+        for phase, seconds in timings:
+            print "{:<8} {:10.3f} s".format(phase, seconds)
 
     return atlas_file_name, new_names
 
+def find_images(folders):
+    '''List the images under `folders` as ``(location, file_name)`` pairs,
+    with file names relative to the folder they were found in.
+    '''
+    file_info = []
+    for folder in folders:
+        location = resource.FileLocation(folder)
+        for dirpath, dirnames, filenames in os.walk(folder):
+            dirnames.sort()
+            for file_name in sorted(filenames):
+                if os.path.splitext(file_name)[1].lower() in image_extensions:
+                    path = os.path.relpath(
+                        os.path.join(dirpath, file_name), folder)
+                    file_info.append((location, path.replace(os.sep, '/')))
+    return file_info
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Pack images into atlases that pyglame.resource loads '
+                    'directly.')
+    parser.add_argument('inputs', nargs='+', metavar='FOLDER',
+        help='folders to search for images')
+    parser.add_argument('-o', '--output', required=True,
+        help='folder to write the atlas images and manifest to')
+    parser.add_argument('-n', '--name', default='atlas',
+        help='base name of the atlas files (default: %(default)s)')
+    parser.add_argument('-s', '--size', type=int, default=1024,
+        help='width and height of each atlas (default: %(default)s)')
+    parser.add_argument('-a', '--allocator', default='strip',
+        choices=sorted(surface.atlas.allocators),
+        help='packing algorithm (default: %(default)s)')
+    parser.add_argument('-t', '--trim', action='store_true',
+        help='cut fully transparent borders off the images')
+    parser.add_argument('-r', '--rotate', action='store_true',
+        help='allow images to be rotated 90 degrees to fit')
+    parser.add_argument('-d', '--dedup', action='store_true',
+        help='store identical images only once')
+    parser.add_argument('-b', '--binary', action='store_true',
+        help='write a binary manifest instead of JSON')
+    parser.add_argument('--rebuild', action='store_true',
+        help='ignore the results of the previous run and repack everything')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+        help='decoding processes, 0 to decode in this process '
+             '(default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+
+    bake_atlas(
+        args.output, args.name,
+        find_images(args.inputs),
+        args.size, args.size,
+        allocator=args.allocator,
+        workers=args.workers,
+        verbose=True,
+        incremental=not args.rebuild,
+        trim=args.trim,
+        rotate=args.rotate,
+        dedup=args.dedup,
+        binary=args.binary)
+
+if __name__ == '__main__':
+    main()
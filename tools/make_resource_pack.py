@@ -0,0 +1,95 @@
+# ----------------------------------------------------------------------------
+#
+# pyglame
+# Copyright (c) 2014 Jacob Smith
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#  * Neither the name of pyglame nor the names of its
+#    contributors may be used to endorse or promote products
+#    derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# ----------------------------------------------------------------------------
+
+import argparse
+import os
+
+from pyglame import pack
+
+def find_files(folders):
+    '''List the files under `folders` as ``(pack_name, path)`` pairs, with
+    pack names relative to the folder they were found in.  Files found in
+    more than one folder are taken from the first.
+    '''
+    files = {}
+    for folder in folders:
+        for dirpath, dirnames, filenames in os.walk(folder):
+            for file_name in filenames:
+                path = os.path.join(dirpath, file_name)
+                name = os.path.relpath(path, folder).replace(os.sep, '/')
+                files.setdefault(name, path)
+    return sorted(files.items())
+
+def build_pack(pack_file_name, files, compress=True, verbose=False):
+    '''Write a resource pack of `files`, a list of ``(pack_name, path)``
+    pairs.  The pack is written to a temporary file first, so that a
+    running game never sees half of it.
+    '''
+    contents = []
+    for name, path in files:
+        with open(path, 'rb') as file_handle:
+            contents.append((name, file_handle.read()))
+
+    temp_file_name = pack_file_name + '.tmp'
+    with open(temp_file_name, 'wb') as file_handle:
+        pack.write(file_handle, contents, compress)
+    # os.rename replaces the target atomically, except on Windows, where it
+    # fails if the target exists.
+    if os.name == 'nt' and os.path.exists(pack_file_name):
+        os.remove(pack_file_name)
+    os.rename(temp_file_name, pack_file_name)
+
+    if verbose:
+        size = sum(len(data) for name, data in contents)
+        print "{} files, {} KB packed into {} KB".format(len(contents),
+            size // 1024, os.path.getsize(pack_file_name) // 1024)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Pack resource files into a single file that '
+                    'pyglame.resource can search like a ZIP file.')
+    parser.add_argument('inputs', nargs='+', metavar='FOLDER',
+        help='folders to pack the files of')
+    parser.add_argument('-o', '--output', required=True,
+        help='pack file to write')
+    parser.add_argument('--store', action='store_true',
+        help='store every file uncompressed')
+    args = parser.parse_args(argv)
+
+    build_pack(args.output, find_files(args.inputs),
+        compress=not args.store, verbose=True)
+
+if __name__ == '__main__':
+    main()